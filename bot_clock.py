@@ -0,0 +1,94 @@
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class SystemClock:
+    """Wall-clock time. Cogs use this unless a simulation hands them a VirtualClock."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def now(self, tz=None) -> datetime:
+        return datetime.now(tz)
+
+
+class VirtualClock:
+    """A clock that only moves when told to, so days of scheduled work can run in seconds.
+
+    `time()` and `monotonic()` return the same virtual Unix timestamp. Time never moves backwards.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+
+    def time(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def now(self, tz=None) -> datetime:
+        return datetime.fromtimestamp(self._now, tz)
+
+    def advance(self, seconds: float):
+        """Moves time forward, e.g. to model the latency of an API call made during a job."""
+        self._now += max(0.0, seconds)
+
+    def advance_to(self, timestamp: float):
+        self._now = max(self._now, timestamp)
+
+
+class VirtualScheduler:
+    """Runs periodic and daily jobs on a VirtualClock in due-time order, the way discord.ext.tasks runs them in real time.
+
+    Jobs are zero-argument coroutine functions. A periodic job may return a number to change its own interval
+    (like `Loop.change_interval`). A job that overruns simply starts late, and the next run is scheduled from
+    its due time, so an overrunning job never runs twice at once.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.runs = {} # job name -> number of runs
+        self._heap = []
+        self._counter = itertools.count()
+
+    def _push(self, due: float, name: str, job, interval: float = None, daily_at=None):
+        heapq.heappush(self._heap, (due, next(self._counter), name, job, interval, daily_at))
+        self.runs.setdefault(name, 0)
+
+    def every(self, seconds: float, job, name: str = None, first_at: float = None):
+        """Runs `job` every `seconds`, first at `first_at` (default: now, as tasks.loop does on start)."""
+        self._push(self.clock.time() if first_at is None else first_at, name or job.__name__, job, interval=seconds)
+
+    def daily(self, at, job, name: str = None):
+        """Runs `job` every day at the datetime.time `at` (UTC unless `at` carries another tzinfo)."""
+        self._push(self._next_daily(at, self.clock.time()), name or job.__name__, job, daily_at=at)
+
+    @staticmethod
+    def _next_daily(at, after: float) -> float:
+        tz = at.tzinfo or timezone.utc
+        current = datetime.fromtimestamp(after, tz)
+        due = current.replace(hour=at.hour, minute=at.minute, second=at.second, microsecond=at.microsecond)
+        if due.timestamp() <= after:
+            due += timedelta(days=1)
+        return due.timestamp()
+
+    async def run_until(self, end: float):
+        """Runs every job due up to `end` (stopping early if jobs overran past it), then leaves the clock at or after `end`."""
+        while self._heap and self._heap[0][0] <= end and self.clock.time() <= end:
+            due, _, name, job, interval, daily_at = heapq.heappop(self._heap)
+            self.clock.advance_to(due)
+            result = await job()
+            self.runs[name] += 1
+            if daily_at is not None:
+                self._push(self._next_daily(daily_at, due), name, job, daily_at=daily_at)
+            else:
+                if isinstance(result, (int, float)) and not isinstance(result, bool) and result > 0:
+                    interval = result
+                self._push(due + interval, name, job, interval=interval)
+        self.clock.advance_to(end)
@@ -0,0 +1,150 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# All bot loggers live under this name, e.g. "decayeddojo.twitch".
+ROOT_LOGGER_NAME = "decayeddojo"
+
+# Records waiting for the writer thread. When full, new records are dropped rather than blocking the event loop.
+LOG_QUEUE_SIZE = 10000
+# At most LOG_RATE_LIMIT_BURST records per message template per LOG_RATE_LIMIT_WINDOW_SECONDS; the rest are counted.
+LOG_RATE_LIMIT_BURST = 5
+LOG_RATE_LIMIT_WINDOW_SECONDS = 60
+
+_listener = None
+
+
+def get_logger(component: str) -> logging.Logger:
+    """Returns the logger for one component of the bot (e.g. "twitch", "name_changer")."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{component}")
+
+
+class RateLimitFilter(logging.Filter):
+    """Rate-limits repeated records by logger, level and message template (the unformatted `msg`).
+
+    Log with %-style arguments (`log.error("Error checking %s: %s", login, e)`) so that the same failure
+    for many streamers shares one template. When a template's window rolls over, the next record it lets
+    through carries the number of suppressed records in `record.suppressed`.
+    """
+
+    def __init__(self, burst: int = LOG_RATE_LIMIT_BURST, window_seconds: float = LOG_RATE_LIMIT_WINDOW_SECONDS):
+        super().__init__()
+        self.burst = burst
+        self.window_seconds = window_seconds
+        self._windows = {} # key -> [window start, records let through, records suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.window_seconds:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if len(self._windows) > LOG_QUEUE_SIZE:
+                self._prune(now)
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+    def _prune(self, now: float):
+        for key in [k for k, w in self._windows.items() if now - w[0] >= self.window_seconds and not w[2]]:
+            del self._windows[key]
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks or formats on the calling thread; overflowing records are counted and dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread instead.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SuppressedCountFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            message += f" ({record.suppressed} similar message(s) suppressed)"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = None, json_output: bool = None):
+    """Routes all bot loggers through a background writer thread. Safe to call more than once.
+
+    Defaults come from the LOG_LEVEL (e.g. "DEBUG", default "INFO") and LOG_FORMAT ("json" or "text")
+    environment variables.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    if json_output is None:
+        json_output = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if json_output:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(SuppressedCountFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(getattr(logging, level, logging.INFO))
+    root_logger.addHandler(queue_handler)
+    root_logger.propagate = False
+
+    # discord.py logs through the "discord" logger; send it through the same queue.
+    discord_logger = logging.getLogger("discord")
+    discord_logger.setLevel(logging.INFO)
+    discord_logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -4,6 +4,11 @@ import aiohttp
 import os
 from datetime import time as dt_time, timezone as dt_timezone
 
+from bot_clock import SystemClock
+from bot_logging import get_logger
+
+log = get_logger("name_changer")
+
 # Environment variables should be loaded in the main bot file,
 # but we need to access them here.
 # Consider passing them via the cog's constructor if they are needed at init time,
@@ -16,21 +21,31 @@ USER_ID_STR = os.getenv('DISCORD_USER_ID')
 SERVER_ID = int(SERVER_ID_STR) if SERVER_ID_STR else None
 USER_ID = int(USER_ID_STR) if USER_ID_STR else None
 
+# The nickname is changed once a day at this time.
+DAILY_CHANGE_TIME = dt_time(hour=6, minute=1, tzinfo=dt_timezone.utc)
+
+def _nickname_change_failed(template: str, *args):
+    """Logs a failed nickname change with %-style arguments and returns (False, the formatted message)."""
+    log.error(template, *args)
+    return False, template % args
+
 class NameChangerCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
+    def __init__(self, bot: commands.Bot, clock=None):
         self.bot = bot
+        self.clock = clock or SystemClock() # Swapped for a bot_clock.VirtualClock by simulation.py
+        self.last_nickname_change_at = None
         # Ensure SERVER_ID and USER_ID are available and valid
         # This warning is still relevant at cog initialization time.
         if SERVER_ID is None or USER_ID is None:
-            print("Warning: NameChangerCog loaded but SERVER_ID or USER_ID is not set. Nickname changes will fail if task is started.")
+            log.warning("NameChangerCog loaded but SERVER_ID or USER_ID is not set. Nickname changes will fail if task is started.")
 
     async def initialize_tasks(self):
         # Start the task only if it's not already running.
         if not self.change_nickname_task.is_running():
             self.change_nickname_task.start()
-            print("NameChangerCog: change_nickname_task started.")
+            log.info("change_nickname_task started.")
         else:
-            print("NameChangerCog: change_nickname_task was already running.")
+            log.info("change_nickname_task was already running.")
 
     async def get_random_male_name(self):
         async with aiohttp.ClientSession() as session:
@@ -41,61 +56,55 @@ class NameChangerCog(commands.Cog):
                     if data['results'] and data['results'][0]['name'] and data['results'][0]['name']['first']:
                         return data['results'][0]['name']['first']
                     else:
-                        print("Error: Could not parse name from randomuser.me API response or results are empty.")
+                        log.error("Could not parse name from randomuser.me API response or results are empty.")
                         return None
             except Exception as e:
-                print(f"Error fetching name from randomuser.me API: {e}")
+                log.error("Error fetching name from randomuser.me API: %s", e)
                 return None
 
     async def perform_nickname_change(self, guild_id: int, target_user_id: int):
-        print(f"Attempting perform_nickname_change for user {target_user_id} on guild {guild_id}")
+        log.info("Attempting perform_nickname_change for user %s on guild %s", target_user_id, guild_id)
         if not guild_id or not target_user_id:
-            error_msg = "Error: Guild ID or Target User ID is None in perform_nickname_change."
-            print(error_msg)
-            return False, error_msg
+            return _nickname_change_failed("Error: Guild ID or Target User ID is None in perform_nickname_change.")
         try:
             guild = self.bot.get_guild(guild_id)
             if not guild:
-                error_msg = f"Error: Server with ID {guild_id} not found. Check DISCORD_SERVER_ID."
-                print(error_msg)
-                return False, error_msg
+                return _nickname_change_failed("Error: Server with ID %s not found. Check DISCORD_SERVER_ID.", guild_id)
             member = guild.get_member(target_user_id)
             if not member:
-                error_msg = f"Error: User with ID {target_user_id} not found on server {guild.name}. Check DISCORD_USER_ID."
-                print(error_msg)
-                return False, error_msg
+                return _nickname_change_failed("Error: User with ID %s not found on server %s. Check DISCORD_USER_ID.",
+                                               target_user_id, guild.name)
             new_name = await self.get_random_male_name()
             if not new_name:
-                error_msg = "Failed to get a new name from API for nickname change."
-                print(error_msg)
-                return False, error_msg
+                return _nickname_change_failed("Failed to get a new name from API for nickname change.")
             await member.edit(nick=new_name)
-            success_msg = f"Successfully changed nickname for {member.display_name} to {new_name}."
-            print(success_msg)
+            self.last_nickname_change_at = self.clock.time()
+            log.info("Successfully changed nickname for %s to %s.", member.display_name, new_name)
             return True, new_name
         except discord.Forbidden:
-            error_msg = f"Permission Error: Bot lacks permission to change nickname for user {target_user_id} on server {guild_id}."
-            print(error_msg)
-            return False, error_msg
+            return _nickname_change_failed(
+                "Permission Error: Bot lacks permission to change nickname for user %s on server %s.", target_user_id, guild_id)
         except Exception as e:
-            error_msg = f"Unexpected error during nickname change: {e}"
-            print(error_msg)
-            return False, error_msg
+            return _nickname_change_failed("Unexpected error during nickname change: %s", e)
 
-    @tasks.loop(time=dt_time(hour=6, minute=1, tzinfo=dt_timezone.utc))
+    @tasks.loop(time=DAILY_CHANGE_TIME)
     async def change_nickname_task(self):
         await self.bot.wait_until_ready()
+        await self.run_daily_change()
+
+    async def run_daily_change(self):
+        """The daily nickname change (driven by the task above, or by simulation.py)."""
         # Ensure SERVER_ID and USER_ID are valid before running the task
         if SERVER_ID is None or USER_ID is None:
-            print("Daily nickname change task skipped: SERVER_ID or USER_ID not configured.")
+            log.warning("Daily nickname change task skipped: SERVER_ID or USER_ID not configured.")
             return
 
-        print("Scheduled daily nickname change task running from cog...")
+        log.info("Scheduled daily nickname change task running from cog...")
         success, message = await self.perform_nickname_change(SERVER_ID, USER_ID)
         if success:
-            print(f"Daily nickname change successful for user {USER_ID} (via cog): new name {message}")
+            log.info("Daily nickname change successful for user %s (via cog): new name %s", USER_ID, message)
         else:
-            print(f"Daily nickname change failed for user {USER_ID} (via cog): {message}")
+            log.error("Daily nickname change failed for user %s (via cog): %s", USER_ID, message)
 
     @commands.hybrid_command(name="changename", description="Manually changes the configured user's nickname.")
     @commands.has_permissions(manage_nicknames=True) # For hybrid commands, this is a good way
@@ -128,7 +137,7 @@ class NameChangerCog(commands.Cog):
             await ctx.send("You do not have 'Manage Nicknames' permission to use this command.", ephemeral=True)
         else:
             await ctx.send(f"An error occurred: {error}", ephemeral=True)
-            print(f"Error in changename_slash_command: {error}")
+            log.error("Error in changename_slash_command: %s", error)
 
     async def cog_unload(self):
         self.change_nickname_task.cancel()
@@ -136,9 +145,9 @@ class NameChangerCog(commands.Cog):
 async def setup(bot: commands.Bot):
     # It's good practice to ensure necessary config is present before adding the cog
     if not os.getenv('DISCORD_SERVER_ID') or not os.getenv('DISCORD_USER_ID'):
-        print("Error: Name Changer Cog not loaded. DISCORD_SERVER_ID or DISCORD_USER_ID not set in .env.")
+        log.error("Name Changer Cog not loaded. DISCORD_SERVER_ID or DISCORD_USER_ID not set in .env.")
     else:
         cog = NameChangerCog(bot)
         await bot.add_cog(cog)
         await cog.initialize_tasks() # Initialize tasks after adding the cog
-        print("NameChangerCog added and tasks initialized.")
+        log.info("NameChangerCog added and tasks initialized.")
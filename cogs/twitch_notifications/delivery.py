@@ -0,0 +1,87 @@
+import discord
+
+from bot_logging import get_logger
+
+log = get_logger("twitch.delivery")
+
+# Name of the webhook the bot creates (or reuses) in each notification channel.
+WEBHOOK_NAME = "Twitch Notifications"
+
+
+class NotificationDelivery:
+    """Sends, fetches and edits notification messages for a channel.
+
+    With webhooks enabled, each channel gets a cached webhook and messages go through the webhook
+    endpoints, which are rate limited separately from the bot's own REST calls. Channels where the
+    bot lacks Manage Webhooks fall back to sending as the bot.
+    """
+
+    def __init__(self, bot, use_webhooks: bool, get_session):
+        self.bot = bot
+        self.use_webhooks = use_webhooks
+        self._get_session = get_session # Coroutine returning the cog's shared aiohttp.ClientSession
+        self._webhooks = {} # channel ID -> discord.Webhook, or None when the channel must use the bot
+
+    async def _get_webhook(self, channel):
+        if not self.use_webhooks:
+            return None
+        if channel.id in self._webhooks:
+            return self._webhooks[channel.id]
+
+        try:
+            webhook = None
+            for existing in await channel.webhooks():
+                if existing.name == WEBHOOK_NAME and existing.token:
+                    webhook = existing
+                    break
+            if webhook is None:
+                webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="Twitch stream notifications")
+            # Rebind to the shared HTTP session so webhook traffic stays off the bot's REST client.
+            webhook = discord.Webhook.from_url(webhook.url, session=await self._get_session())
+        except discord.Forbidden:
+            log.warning("Missing Manage Webhooks in channel %s, sending as the bot instead.", channel.id)
+            webhook = None
+        except discord.HTTPException as e:
+            log.error("Error setting up webhook for channel %s: %s", channel.id, e)
+            return None # Not cached, so the webhook is retried on the next delivery
+
+        self._webhooks[channel.id] = webhook
+        return webhook
+
+    def _webhook_identity(self):
+        if self.bot.user is None:
+            return {}
+        return {'username': self.bot.user.display_name, 'avatar_url': self.bot.user.display_avatar.url}
+
+    async def send(self, channel, **kwargs):
+        """Sends a message to `channel` and returns it (a discord.WebhookMessage when sent via webhook)."""
+        webhook = await self._get_webhook(channel)
+        if webhook is not None:
+            try:
+                return await webhook.send(wait=True, **self._webhook_identity(), **kwargs)
+            except (discord.NotFound, discord.Forbidden) as e:
+                # The webhook was deleted or its permissions revoked; set it up again next time.
+                log.warning("Webhook for channel %s unusable (%s), falling back to the bot.", channel.id, e)
+                self._webhooks.pop(channel.id, None)
+        return await channel.send(**kwargs)
+
+    async def fetch_message(self, channel, message_id: int, via_webhook: bool = None):
+        """Fetches a notification so that it can be edited by whichever backend sent it.
+
+        `via_webhook` is what `sent_via_webhook()` said about the message when it was sent, so the right
+        backend is asked directly. Left as None for messages recorded before that was stored, the webhook
+        is tried first and the bot second.
+        """
+        webhook = await self._get_webhook(channel) if via_webhook is not False else None
+        if webhook is not None:
+            try:
+                return await webhook.fetch_message(message_id)
+            except (discord.NotFound, discord.Forbidden):
+                if via_webhook:
+                    raise
+                # Sent by the bot, e.g. before webhooks were enabled
+        return await channel.fetch_message(message_id)
+
+    @staticmethod
+    def sent_via_webhook(message) -> bool:
+        return isinstance(message, discord.WebhookMessage)
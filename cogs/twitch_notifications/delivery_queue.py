@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from bot_logging import get_logger
+
+log = get_logger("twitch.delivery_queue")
+
+# Lower numbers are delivered first.
+PRIORITY_GO_LIVE = 0
+PRIORITY_OFFLINE_SUMMARY = 1
+PRIORITY_CLIP_DIGEST = 2
+PRIORITY_VIEWER_EDIT = 3
+
+# Jobs at or below this priority (in importance) may be shed under pressure; more important ones never are.
+SHEDDABLE_PRIORITY = PRIORITY_VIEWER_EDIT
+
+_REMOVED = object() # Placeholder for a job that was superseded or dropped while still in the heap
+
+
+class DeliveryQueue:
+    """Priority queue of Discord deliveries, run one at a time by a single worker.
+
+    Jobs are zero-argument coroutine functions. A job submitted with a `coalesce_key` replaces any
+    pending job with the same key (e.g. an older viewer-count edit of the same message). Once the
+    queue holds `pressure_depth` jobs, sheddable jobs older than `stale_after_seconds` are dropped
+    instead of delivered, and past `max_depth` the oldest sheddable job makes room for new work.
+    """
+
+    def __init__(self, pressure_depth: int = 50, max_depth: int = 500, stale_after_seconds: float = 30,
+                 clock=time.monotonic):
+        self.pressure_depth = pressure_depth
+        self.max_depth = max_depth
+        self.stale_after_seconds = stale_after_seconds
+        self._clock = clock
+        self.processed = 0
+        self.superseded = 0
+        self.dropped = 0
+        self.failed = 0
+        self._heap = []
+        self._pending = {} # coalesce key -> heap entry
+        self._depth = 0
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False # Set by drain(); the worker stops taking new jobs
+        self._worker = None
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> dict:
+        return {'depth': self.depth, 'processed': self.processed, 'superseded': self.superseded,
+                'dropped': self.dropped, 'failed': self.failed}
+
+    def _remove(self, entry):
+        entry[-1] = _REMOVED
+        self._depth -= 1
+        if entry[3] is not None:
+            self._pending.pop(entry[3], None)
+
+    def _shed_one(self, incoming_priority: int) -> bool:
+        """Drops the least important, oldest sheddable job that is less important than the incoming one."""
+        victims = [e for e in self._heap if e[-1] is not _REMOVED and e[0] >= SHEDDABLE_PRIORITY and e[0] >= incoming_priority]
+        if not victims:
+            return False
+        victim = min(victims, key=lambda e: (-e[0], e[1]))
+        self._remove(victim)
+        self.dropped += 1
+        return True
+
+    def submit(self, priority: int, job, coalesce_key=None) -> bool:
+        """Queues a delivery. Returns False if it was shed immediately because the queue is full."""
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._remove(self._pending[coalesce_key])
+            self.superseded += 1
+        if self._depth >= self.max_depth and not self._shed_one(priority):
+            if priority >= SHEDDABLE_PRIORITY:
+                self.dropped += 1
+                return False
+            # Important work is never refused; max_depth only bounds sheddable jobs.
+
+        entry = [priority, next(self._counter), self._clock(), coalesce_key, job]
+        heapq.heappush(self._heap, entry)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = entry
+        self._depth += 1
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def _pop(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[-1] is _REMOVED:
+                continue
+            self._depth -= 1
+            if entry[3] is not None:
+                self._pending.pop(entry[3], None)
+            return entry
+        return None
+
+    async def run_pending(self):
+        """Delivers queued jobs in priority order until the queue is empty (or drain() has given up)."""
+        while not self._closing:
+            entry = self._pop()
+            if entry is None:
+                self._idle.set()
+                return
+            priority, _, enqueued_at, _, job = entry
+            under_pressure = self._depth + 1 >= self.pressure_depth
+            if priority >= SHEDDABLE_PRIORITY and under_pressure and self._clock() - enqueued_at > self.stale_after_seconds:
+                self.dropped += 1
+                continue
+            try:
+                await job()
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                log.error("Error delivering job (priority %s): %s", priority, e)
+
+    async def _run_forever(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.run_pending()
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def drain(self, timeout: float, job_grace_seconds: float = 2) -> bool:
+        """Delivers queued jobs for up to `timeout` seconds in total, then stops the worker. Returns True if nothing is left.
+
+        New jobs stop being started `job_grace_seconds` (at most half of `timeout`) before the deadline, so a job
+        already being delivered can finish rather than be cut off between being sent and being recorded. A job
+        still running at the deadline is cancelled. Jobs never started stay queued (see `depth`).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        grace = min(job_grace_seconds, timeout / 2)
+        self.start()
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout - grace)
+        except asyncio.TimeoutError:
+            pass
+        self._closing = True
+        self._wakeup.set() # Lets an idle worker see _closing and exit
+        if self._worker is not None:
+            done, _ = await asyncio.wait({self._worker}, timeout=max(0, deadline - loop.time()))
+            if not done:
+                log.warning("Delivery still in progress at the shutdown deadline, cancelling it.")
+            self.stop()
+        return self._depth == 0
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
@@ -0,0 +1,232 @@
+"""Record and replay Twitch API traffic, to reproduce production load offline.
+
+Record: start the bot with TWITCH_HELIX_RECORD=trace.jsonl.gz and every Helix/OAuth request is appended
+to the trace with its timestamp, latency, status and response body (client ID, secret and access token
+are never written). Requests that fail are recorded too: error statuses as they were, and requests that got
+no response at all (timeouts, connection errors) with status null and the exception name in `error`.
+
+Replay: python -m cogs.twitch_notifications.helix_trace replay trace.jsonl.gz --port 8080
+then start the bot with TWITCH_API_BASE_URL=http://127.0.0.1:8080/helix and
+TWITCH_AUTH_BASE_URL=http://127.0.0.1:8080/oauth2. Each request gets the response recorded for the same
+request at the same point of the trace, after the recorded latency (divided by --speed). Time-valued
+parameters such as the clip `started_at` are ignored when matching, and requests that got no response are
+answered by dropping the connection.
+
+The trace itself always plays back in real time: the bot polls on its own real-time schedule, so a trace
+running faster would show it only some of the recorded states at a fraction of the recorded request rate.
+--speed only shortens response latencies. To compress days of activity, use simulation.py, which drives
+the cogs on a virtual clock.
+
+Summary: python -m cogs.twitch_notifications.helix_trace summary trace.jsonl.gz
+"""
+import argparse
+import asyncio
+import bisect
+import gzip
+import json
+import time
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from bot_logging import configure_logging, get_logger
+
+log = get_logger("twitch.helix_trace")
+
+# Query parameters that are credentials and never written to a trace.
+REDACTED_PARAMS = {'client_id', 'client_secret'}
+# Query parameters derived from the wall clock (e.g. /clips?started_at=), which never repeat exactly. Replay
+# matches without them and relies on the trace offset to pick the response recorded at the same moment.
+TIME_PARAMS = {'started_at', 'ended_at'}
+# Access tokens in recorded responses are replaced with this value.
+REPLAY_TOKEN = 'replay-token'
+# Flush the trace file after this many records, so a crash loses little.
+FLUSH_EVERY = 100
+
+
+def _open_trace(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _normalize_query(params) -> list:
+    """Sorted [key, value] pairs without credentials, so equal requests always produce equal keys."""
+    if not params:
+        return []
+    items = params.items() if isinstance(params, dict) else params
+    return sorted([str(k), str(v)] for k, v in items if k not in REDACTED_PARAMS)
+
+
+def _lookup_key(method: str, path: str, query: list) -> tuple:
+    return method, path, tuple(tuple(pair) for pair in query if pair[0] not in TIME_PARAMS)
+
+
+class HelixTraceRecorder:
+    """Appends one compact JSON line per Twitch API request to a (optionally gzipped) trace file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._file = _open_trace(path, 'a')
+        log.info("Recording Twitch API traffic to %s", path)
+
+    def record(self, method: str, url: str, params, status, body, started_at: float, latency: float, error: str = None):
+        """Appends one request. `status` is None and `error` names the exception when no response was received."""
+        if self._file is None:
+            return
+        if isinstance(body, dict) and 'access_token' in body:
+            body = dict(body, access_token=REPLAY_TOKEN)
+        entry = {
+            'ts': round(started_at, 3), 'method': method, 'path': urlsplit(url).path,
+            'query': _normalize_query(params), 'status': status, 'latency': round(latency, 4), 'body': body,
+        }
+        if error:
+            entry['error'] = error
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.recorded += 1
+        if self.recorded % FLUSH_EVERY == 0:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_trace(path: str) -> list:
+    with _open_trace(path, 'r') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+class HelixReplay:
+    """Serves recorded responses keyed by method, path and query, as they were at the same offset into the trace.
+
+    Replay time starts at the first request and runs in real time, so state changes in the trace (streams
+    going live, viewer counts) happen at the same relative moments. `speed` divides response latencies only.
+    """
+
+    def __init__(self, entries: list, speed: float = 1.0, clock=time.monotonic):
+        self.speed = speed
+        self.served = 0
+        self.misses = 0
+        self._clock = clock
+        self._replay_started = None
+        self._index = {}
+        start_ts = entries[0]['ts'] if entries else 0
+        for entry in entries:
+            key = _lookup_key(entry['method'], entry['path'], entry['query'])
+            offsets, key_entries = self._index.setdefault(key, ([], []))
+            offsets.append(entry['ts'] - start_ts)
+            key_entries.append(entry)
+
+    def lookup(self, method: str, path: str, query: list, trace_offset: float):
+        """Returns the latest recorded response at or before `trace_offset`, or the first one if none yet."""
+        indexed = self._index.get(_lookup_key(method, path, query))
+        if not indexed:
+            return None
+        offsets, entries = indexed
+        return entries[max(bisect.bisect_right(offsets, trace_offset) - 1, 0)]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        now = self._clock()
+        if self._replay_started is None:
+            self._replay_started = now
+        trace_offset = now - self._replay_started
+
+        entry = self.lookup(request.method, request.path, _normalize_query(list(request.query.items())), trace_offset)
+        if entry is None:
+            if request.path.endswith('/token'):
+                # Tokens may not have been requested during the recording; hand out one that never expires soon.
+                return web.json_response({'access_token': REPLAY_TOKEN, 'expires_in': 3600, 'token_type': 'bearer'})
+            self.misses += 1
+            log.warning("Replay miss: %s %s?%s", request.method, request.path, request.query_string)
+            return web.json_response({'error': 'Not Found', 'status': 404, 'message': 'Request not in trace'}, status=404)
+
+        await asyncio.sleep(entry['latency'] / self.speed)
+        self.served += 1
+        if entry['status'] is None:
+            # No response was received when recording (timeout, connection error); fail the same way.
+            request.transport.close()
+            return web.Response()
+        if entry['body'] is None:
+            return web.Response(status=entry['status'])
+        return web.json_response(entry['body'], status=entry['status'])
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        return app
+
+
+def _percentile(sorted_values: list, fraction: float):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize_trace(entries: list) -> dict:
+    """Request counts, error counts and latency percentiles per endpoint, plus the busiest minute."""
+    per_path = {}
+    per_minute = {}
+    for entry in entries:
+        stats = per_path.setdefault(entry['path'], {'requests': 0, 'errors': 0, 'latencies': []})
+        stats['requests'] += 1
+        stats['latencies'].append(entry['latency'])
+        if entry['status'] != 200:
+            stats['errors'] += 1
+        minute = int(entry['ts'] // 60)
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+
+    summary = {'requests': len(entries),
+               'duration_seconds': round(entries[-1]['ts'] - entries[0]['ts'], 1) if entries else 0,
+               'peak_requests_per_minute': max(per_minute.values(), default=0),
+               'endpoints': {}}
+    for path, stats in sorted(per_path.items()):
+        latencies = sorted(stats.pop('latencies'))
+        stats.update({'p50_latency': _percentile(latencies, 0.5), 'p95_latency': _percentile(latencies, 0.95),
+                      'max_latency': latencies[-1]})
+        summary['endpoints'][path] = stats
+    return summary
+
+
+async def _serve(replay: HelixReplay, host: str, port: int):
+    runner = web.AppRunner(replay.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Replaying on http://%s:%s (latency / %s). Point TWITCH_API_BASE_URL at http://%s:%s/helix.",
+             host, port, replay.speed, host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        log.info("Replay stopped: %s served, %s misses.", replay.served, replay.misses)
+        await runner.cleanup()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or summarize a recorded Twitch API trace.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    replay_parser = subparsers.add_parser('replay', help="Serve a trace from a local stand-in server.")
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--host', default='127.0.0.1')
+    replay_parser.add_argument('--port', type=int, default=8080)
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="Divide recorded latencies by this. The trace still plays back in real time.")
+    summary_parser = subparsers.add_parser('summary', help="Print per-endpoint request counts and latencies.")
+    summary_parser.add_argument('trace')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    entries = load_trace(args.trace)
+    if args.command == 'summary':
+        print(json.dumps(summarize_trace(entries), indent=4))
+        return
+    try:
+        asyncio.run(_serve(HelixReplay(entries, speed=args.speed), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import bisect
+
+
+class LoginIndex:
+    """Sorted (lowercase login, broadcaster ID) pairs of one guild's registrations, for prefix lookups.
+
+    Prefix completion is a binary search plus a short scan, so it stays fast for guilds with
+    thousands of registrations. The index is updated in place on every add, remove and rename.
+    """
+
+    def __init__(self, registrations: dict = None):
+        self._entries = sorted((details.get('login_name', '').lower(), twitch_user_id)
+                               for twitch_user_id, details in (registrations or {}).items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def page(self, start: int, stop: int) -> list:
+        """Returns the (login, broadcaster ID) pairs at positions [start, stop) in login order."""
+        return self._entries[start:stop]
+
+    def add(self, login_name: str, twitch_user_id: str):
+        entry = (login_name.lower(), twitch_user_id)
+        index = bisect.bisect_left(self._entries, entry)
+        if index == len(self._entries) or self._entries[index] != entry:
+            self._entries.insert(index, entry)
+
+    def remove(self, login_name: str, twitch_user_id: str):
+        entry = (login_name.lower(), twitch_user_id)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def rename(self, old_login_name: str, new_login_name: str, twitch_user_id: str):
+        self.remove(old_login_name, twitch_user_id)
+        self.add(new_login_name, twitch_user_id)
+
+    def find(self, login_name: str):
+        """Returns the broadcaster ID registered under exactly this login (case-insensitive), or None."""
+        login_name = login_name.lower()
+        index = bisect.bisect_left(self._entries, (login_name,))
+        if index < len(self._entries) and self._entries[index][0] == login_name:
+            return self._entries[index][1]
+        return None
+
+    def complete(self, prefix: str, limit: int = 25) -> list:
+        """Returns up to `limit` (login, broadcaster ID) pairs whose login starts with `prefix`, in login order."""
+        prefix = prefix.lower()
+        matches = []
+        for index in range(bisect.bisect_left(self._entries, (prefix,)), len(self._entries)):
+            login_name, twitch_user_id = self._entries[index]
+            if not login_name.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append((login_name, twitch_user_id))
+        return matches
@@ -0,0 +1,40 @@
+import discord
+
+# Buttons stop responding after this long without use.
+NOTIFYLIST_VIEW_TIMEOUT_SECONDS = 5 * 60
+
+
+class NotifyListView(discord.ui.View):
+    """Previous/Next buttons for /twitch notifylist. Each page is rendered only when it is shown.
+
+    `render_page(page)` returns (embed, page actually shown, total pages); pages are clamped, so a list
+    that shrank while the view was open still lands on a valid page.
+    """
+
+    def __init__(self, render_page, user_id: int, page: int, total_pages: int):
+        super().__init__(timeout=NOTIFYLIST_VIEW_TIMEOUT_SECONDS)
+        self.render_page = render_page
+        self.user_id = user_id
+        self.page = page
+        self.total_pages = total_pages
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.total_pages - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        embed, self.page, self.total_pages = self.render_page(page)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
@@ -0,0 +1,84 @@
+import time
+import zlib
+
+from bot_logging import get_logger
+
+log = get_logger("twitch.timing_wheel")
+
+
+class TimingWheel:
+    """Timing wheel that spreads keys evenly over the slots of a fixed polling interval.
+
+    Each key is polled once per revolution in its slot, so a minute's worth of requests is issued a few
+    at a time instead of all at once. The first key set is dealt out by hash rank; after that a key keeps
+    its slot for as long as it stays in the set, and new keys go to the least-loaded slot. Adding or
+    removing a key never moves another one, so no key's time between polls is stretched.
+    """
+
+    def __init__(self, interval_seconds: float, slot_seconds: float):
+        self.num_slots = max(1, round(interval_seconds / slot_seconds))
+        self.interval_seconds = interval_seconds
+        self.slot_seconds = interval_seconds / self.num_slots
+        self.current_slot = 0
+        self.overruns = 0 # Slots that took longer than slot_seconds
+        self.slow_revolutions = 0 # Revolutions that took noticeably longer than interval_seconds
+        self._revolution_started_at = None
+        self._slot_assignment = {}
+        self._slots = [[] for _ in range(self.num_slots)]
+        self._assigned_keys = frozenset()
+
+    @staticmethod
+    def _hash(key) -> int:
+        # Python's hash() of str is randomised per process; crc32 keeps slots stable across restarts.
+        return zlib.crc32(str(key).encode())
+
+    def _assign(self, keys):
+        keys = frozenset(keys)
+        if keys == self._assigned_keys:
+            return
+        if not self._slot_assignment:
+            # Rank keys by hash and deal them out in order, so slot sizes never differ by more than one.
+            ranked = sorted(keys, key=lambda k: (self._hash(k), str(k)))
+            self._slot_assignment = {key: rank * self.num_slots // len(ranked) for rank, key in enumerate(ranked)}
+            for key in ranked:
+                self._slots[self._slot_assignment[key]].append(key)
+        else:
+            for key in self._assigned_keys - keys:
+                self._slots[self._slot_assignment.pop(key)].remove(key)
+            for key in sorted(keys - self._assigned_keys, key=lambda k: (self._hash(k), str(k))):
+                # Least-loaded slot; ties go to the first one at or after the key's hashed home slot.
+                home = self._hash(key) % self.num_slots
+                slot = min(range(self.num_slots), key=lambda s: (len(self._slots[s]), (s - home) % self.num_slots))
+                self._slot_assignment[key] = slot
+                self._slots[slot].append(key)
+        self._assigned_keys = keys
+
+    def slot_for(self, key, keys) -> int:
+        self._assign(keys)
+        return self._slot_assignment[key]
+
+    def keys_for_slot(self, slot: int, keys) -> list:
+        self._assign(keys)
+        return list(self._slots[slot])
+
+    def advance(self, now: float = None) -> int:
+        """Returns the slot due now and moves the wheel on by one slot."""
+        now = time.time() if now is None else now
+        slot = self.current_slot
+        if slot == 0:
+            if self._revolution_started_at is not None:
+                revolution_seconds = now - self._revolution_started_at
+                if revolution_seconds > self.interval_seconds + self.slot_seconds:
+                    self.slow_revolutions += 1
+                    log.warning("Poll cycle took %.1fs, longer than the %.0fs interval.", revolution_seconds, self.interval_seconds)
+            self._revolution_started_at = now
+        self.current_slot = (slot + 1) % self.num_slots
+        return slot
+
+    def record_slot_duration(self, slot: int, elapsed_seconds: float) -> bool:
+        """Reports a slot whose work overran its width. Returns True if it overran."""
+        if elapsed_seconds <= self.slot_seconds:
+            return False
+        self.overruns += 1
+        log.warning("Slot %s overran its %.1fs window (%.1fs, %s overrun(s) so far).", slot, self.slot_seconds, elapsed_seconds, self.overruns)
+        return True
@@ -1,3 +1,4 @@
+import asyncio
 import discord
 from discord.ext import tasks, commands
 from discord import app_commands
@@ -6,16 +7,113 @@ import os
 # import sys # Unused
 import time
 import json
-from datetime import datetime # dt_time and dt_timezone are unused
+import math
+import functools
+import itertools
+from datetime import datetime, timezone as dt_timezone
+
+from bot_clock import SystemClock
+from bot_logging import get_logger
+from cogs.twitch_notifications.delivery import NotificationDelivery
+from cogs.twitch_notifications.login_index import LoginIndex
+from cogs.twitch_notifications.notify_list import NotifyListView
+from cogs.twitch_notifications.delivery_queue import (
+    DeliveryQueue, PRIORITY_GO_LIVE, PRIORITY_OFFLINE_SUMMARY, PRIORITY_CLIP_DIGEST, PRIORITY_VIEWER_EDIT)
+from cogs.twitch_notifications.timing_wheel import TimingWheel
+from cogs.twitch_notifications.viewer_stats import add_viewer_sample
 
 # Configuration from Environment Variables - ensure these are loaded in main.py
 # and accessible if needed, or pass them to the cog
+log = get_logger("twitch")
+
 TWITCH_CLIENT_ID = os.getenv('TWITCH_CLIENT_ID')
 TWITCH_CLIENT_SECRET = os.getenv('TWITCH_CLIENT_SECRET')
 
+# Overridable so the cog can run against a local replay server (see helix_trace.py).
+TWITCH_API_BASE_URL = os.getenv('TWITCH_API_BASE_URL', 'https://api.twitch.tv/helix').rstrip('/')
+TWITCH_AUTH_BASE_URL = os.getenv('TWITCH_AUTH_BASE_URL', 'https://id.twitch.tv/oauth2').rstrip('/')
+# When set, every Twitch API request and response is appended to this trace file.
+TWITCH_HELIX_RECORD = os.getenv('TWITCH_HELIX_RECORD')
+
 # --- JSON Persistence ---
 SERVER_SETTINGS_FILE = 'server_settings.json'
 STREAM_REGISTRATIONS_FILE = 'stream_registrations.json'
+# Compact snapshot of live-stream state, written after every poll cycle and read back on startup.
+LIVE_STATE_FILE = 'twitch_live_state.json'
+# Stream and clip summaries still queued when a shutdown deadline passed; queued again on the next start.
+PENDING_SUMMARIES_FILE = 'twitch_pending_summaries.json'
+LIVE_STATE_FIELDS = ('last_live_status', 'last_stream_id', 'last_message_id', 'last_message_embed_index',
+                     'last_message_via_webhook', 'stream_start_timestamp')
+# Helix /streams accepts up to 100 `user_id` parameters per request.
+STREAMS_BATCH_SIZE = 100
+
+# --- Go-Live Digests ---
+# Discord allows at most 10 embeds and 6000 embed characters per message.
+DISCORD_MAX_EMBEDS_PER_MESSAGE = 10
+DISCORD_MAX_EMBED_CHARACTERS = 6000
+# Longest digest window an admin can configure with /twitchadmin set_digest.
+MAX_DIGEST_SECONDS = 15 * 60
+# Discord shows at most 25 autocomplete choices.
+AUTOCOMPLETE_MAX_CHOICES = 25
+# Channels per /twitch notifylist page; keeps each page far below Discord's 4096-character embed description limit.
+NOTIFYLIST_PAGE_SIZE = 15
+# Rendered notifylist pages kept per guild before the oldest are discarded.
+NOTIFYLIST_MAX_CACHED_PAGES = 50
+
+# --- Delivery ---
+# Send notifications through a per-channel webhook instead of the bot's REST client (needs Manage Webhooks).
+USE_WEBHOOK_DELIVERY = os.getenv('TWITCH_WEBHOOK_DELIVERY', '').lower() in ('1', 'true', 'yes')
+
+# --- Polling ---
+# Every broadcaster is checked once per interval; the work is spread over slots of TWITCH_POLL_SLOT_SECONDS.
+POLL_INTERVAL_SECONDS = 60
+try:
+    POLL_SLOT_SECONDS = max(1.0, min(float(os.getenv('TWITCH_POLL_SLOT_SECONDS', '5')), POLL_INTERVAL_SECONDS))
+except ValueError:
+    log.warning("TWITCH_POLL_SLOT_SECONDS is not a number. Using 5 seconds.")
+    POLL_SLOT_SECONDS = 5.0
+
+# --- Viewer Statistics ---
+# Live viewer counts from the /streams polls are folded into each stream's peak, average and median at most once
+# per TWITCH_VIEWER_SAMPLE_SECONDS (default: every poll), independently of how often the announcement is edited.
+try:
+    VIEWER_SAMPLE_SECONDS = max(0.0, float(os.getenv('TWITCH_VIEWER_SAMPLE_SECONDS', str(POLL_INTERVAL_SECONDS))))
+except ValueError:
+    log.warning("TWITCH_VIEWER_SAMPLE_SECONDS is not a number. Sampling every poll.")
+    VIEWER_SAMPLE_SECONDS = float(POLL_INTERVAL_SECONDS)
+
+# --- Shutdown ---
+# On shutdown, queued notifications get this long to go out before state is saved and the cog exits.
+# Keep it below the grace period of whatever stops the bot (e.g. 10 seconds for `docker stop`).
+try:
+    SHUTDOWN_TIMEOUT_SECONDS = max(0.0, float(os.getenv('TWITCH_SHUTDOWN_TIMEOUT_SECONDS', '8')))
+except ValueError:
+    log.warning("TWITCH_SHUTDOWN_TIMEOUT_SECONDS is not a number. Using 8 seconds.")
+    SHUTDOWN_TIMEOUT_SECONDS = 8.0
+
+# --- Identity Refresh ---
+# Helix /users accepts up to 100 `id` parameters per request.
+IDENTITY_REFRESH_BATCH_SIZE = 100
+# Every stored broadcaster ID is re-resolved roughly once per this many seconds.
+IDENTITY_REFRESH_CYCLE_SECONDS = 24 * 60 * 60
+# Never refresh more often than this, however many batches there are.
+IDENTITY_REFRESH_MIN_INTERVAL_SECONDS = 5 * 60
+# After a failed token or /users request, the same batch is retried this soon instead of a full batch interval later.
+IDENTITY_REFRESH_RETRY_SECONDS = 60
+
+# --- Clip Harvesting ---
+# While a stream is live, new clips are collected at most once per this many seconds.
+CLIP_HARVEST_INTERVAL_SECONDS = 5 * 60
+# Each pass re-reads this much of the previous window, since Twitch indexes clips with a delay.
+CLIP_HARVEST_OVERLAP_SECONDS = 10 * 60
+# Helix /clips returns at most 100 clips per page.
+CLIP_PAGE_SIZE = 100
+# Upper bound on pages followed in one pass, so a clip-heavy stream can't cause a request burst.
+CLIP_MAX_PAGES_PER_HARVEST = 5
+# Discord embeds hold at most 25 fields; only the most viewed clips are kept for the summary.
+CLIP_SUMMARY_MAX_CLIPS = 25
+# Clip state of a stream, shared by every guild's registration of the broadcaster so each stream is harvested once.
+CLIP_STATE_FIELDS = ('seen_clip_ids', 'stream_clips', 'last_clip_harvest_at', 'clips_final_harvest_done')
 
 def _load_json_data(filepath, description):
     if not os.path.exists(filepath):
@@ -24,19 +122,71 @@ def _load_json_data(filepath, description):
         with open(filepath, 'r') as f:
             data = json.load(f)
             if not isinstance(data, dict):
-                print(f"Warning: Data in {filepath} ({description}) is not a dictionary. Resetting to empty.")
+                log.warning("Data in %s (%s) is not a dictionary. Resetting to empty.", filepath, description)
                 return {}
             return data
     except (json.JSONDecodeError, IOError) as e:
-        print(f"Error loading {filepath} ({description}): {e}. Returning empty dictionary.")
+        log.error("Error loading %s (%s): %s. Returning empty dictionary.", filepath, description, e)
         return {}
 
+def _stream_started_timestamp(stream_data, now: float = None):
+    """Returns the Helix `started_at` of a stream as a Unix timestamp, falling back to `now` (default: the current time)."""
+    started_at = stream_data.get('started_at')
+    if started_at:
+        try:
+            return datetime.strptime(started_at, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=dt_timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return time.time() if now is None else now
+
+def _box_art_url(game_info):
+    if game_info and game_info.get('box_art_url'):
+        return game_info['box_art_url'].replace('{width}', '285').replace('{height}', '380')
+    return None
+
 def _save_json_data(data, filepath, description):
+    # Written to a temporary file and swapped in, so a crash or kill mid-write never leaves a truncated file.
+    tmp_path = f"{filepath}.tmp"
     try:
-        with open(filepath, 'w') as f:
+        with open(tmp_path, 'w') as f:
             json.dump(data, f, indent=4)
+        os.replace(tmp_path, filepath)
+    except IOError as e:
+        log.error("Error saving %s (%s): %s", filepath, description, e)
+
+def _save_live_state_snapshot(guild_stream_registrations, filepath=LIVE_STATE_FILE, saved_at: float = None):
+    """Atomically writes the live-stream fields of every live registration in compact form."""
+    snapshot = {'saved_at': time.time() if saved_at is None else saved_at, 'live': {}}
+    for guild_id_str, streams in guild_stream_registrations.items():
+        for twitch_user_id, details in streams.items():
+            if details.get('last_live_status'):
+                snapshot['live'].setdefault(guild_id_str, {})[twitch_user_id] = {
+                    field: details.get(field) for field in LIVE_STATE_FIELDS}
+    tmp_path = f"{filepath}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, filepath)
     except IOError as e:
-        print(f"Error saving {filepath} ({description}): {e}")
+        log.error("Error saving %s (live state snapshot): %s", filepath, e)
+
+def _apply_live_state_snapshot(guild_stream_registrations, snapshot, registrations_saved_at):
+    """Overlays a live-state snapshot onto loaded registrations if it is newer than the registrations file.
+
+    Returns the snapshot's saved_at timestamp, or None if the snapshot was not applied.
+    """
+    saved_at = snapshot.get('saved_at')
+    if not saved_at or saved_at < registrations_saved_at:
+        return None
+    live = snapshot.get('live', {})
+    for guild_id_str, streams in guild_stream_registrations.items():
+        for twitch_user_id, details in streams.items():
+            live_details = live.get(guild_id_str, {}).get(twitch_user_id)
+            if live_details:
+                details.update({field: live_details.get(field) for field in LIVE_STATE_FIELDS})
+            else:
+                details['last_live_status'] = False
+    return saved_at
 
 
 class TwitchNotificationsCog(commands.Cog):
@@ -44,61 +194,204 @@ class TwitchNotificationsCog(commands.Cog):
     twitch_admin_group = app_commands.Group(name="twitchadmin", description="Admin commands for Twitch feature configuration.")
     twitch_user_group = app_commands.Group(name="twitch", description="Manage Twitch stream notifications for Twitch channels.")
 
-    def __init__(self, bot: commands.Bot):
+    def __init__(self, bot: commands.Bot, clock=None):
         self.bot = bot
+        self.clock = clock or SystemClock() # Swapped for a bot_clock.VirtualClock by simulation.py
         self.twitch_access_token = None
         self.twitch_token_expires_at = 0
 
         self.guild_settings = _load_json_data(SERVER_SETTINGS_FILE, "server settings")
         self.guild_stream_registrations = _load_json_data(STREAM_REGISTRATIONS_FILE, "stream registrations")
+        self._login_indexes = {} # guild ID -> LoginIndex of its registrations, built on first use
+        # guild ID -> {'ids': {filters: matching broadcaster IDs}, 'pages': {(filters, page): description}},
+        # dropped whenever that guild's registrations change.
+        self._notifylist_cache = {}
+
+        # Warm restart: the snapshot is newer than the registrations file if the last save before shutdown was lost.
+        registrations_saved_at = os.path.getmtime(STREAM_REGISTRATIONS_FILE) if os.path.exists(STREAM_REGISTRATIONS_FILE) else 0
+        snapshot_saved_at = _apply_live_state_snapshot(
+            self.guild_stream_registrations, _load_json_data(LIVE_STATE_FILE, "live state snapshot"), registrations_saved_at)
+        # The last moment streams were known to be live: whichever of the two files was written last. After a crash the
+        # registrations file (rewritten on every live poll) is usually the newer one.
+        self.last_known_live_at = snapshot_saved_at or registrations_saved_at or None
+        self._reconciled = False
+        self.poll_wheel = TimingWheel(POLL_INTERVAL_SECONDS, POLL_SLOT_SECONDS)
+        # The wheel rounds the slot width so that whole slots fill the interval (e.g. 7s -> 6.67s); tick at that width.
+        self.check_twitch_streams_task.change_interval(seconds=self.poll_wheel.slot_seconds)
+        if self.poll_wheel.slot_seconds != POLL_SLOT_SECONDS:
+            log.info("TWITCH_POLL_SLOT_SECONDS=%s does not divide the %ss poll interval; using %.2fs slots.",
+                     POLL_SLOT_SECONDS, POLL_INTERVAL_SECONDS, self.poll_wheel.slot_seconds)
+        # Open go-live digest per guild: {'message', 'embeds', 'opened_at'}. Lost on restart, which only means a new digest starts.
+        self._go_live_digests = {}
+        self._http_session = None # Shared aiohttp session, created on first use
+        self.helix_recorder = None
+        if TWITCH_HELIX_RECORD:
+            # Imported here so that aiohttp's server side is only loaded when traffic is being recorded.
+            from cogs.twitch_notifications.helix_trace import HelixTraceRecorder
+            self.helix_recorder = HelixTraceRecorder(TWITCH_HELIX_RECORD)
+        self.delivery = NotificationDelivery(bot, USE_WEBHOOK_DELIVERY, self._get_http_session)
+        self.delivery_queue = DeliveryQueue(clock=self.clock.monotonic)
+        self._pending_announcements = set() # (guild ID, broadcaster ID) of go-live announcements queued but not yet sent
+        # Summaries queued but not yet sent: id -> (priority, channel, embeds, sent_log, login_name)
+        self._pending_summaries = {}
+        self._summary_ids = itertools.count()
+        self._saved_summaries = _load_json_data(PENDING_SUMMARIES_FILE, "pending summaries").get('summaries', [])
+        self._poll_lock = asyncio.Lock() # Held while polling, so shutdown can wait for a poll to finish
+        self._shutting_down = False
 
         if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
-            print("TwitchNotificationsCog: Warning - Twitch features will be DISABLED (missing client ID or secret). Task will not start.")
+            log.warning("Twitch features will be DISABLED (missing client ID or secret). Task will not start.")
 
     async def initialize_tasks(self):
         if TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET:
+            self.delivery_queue.start()
             if not self.check_twitch_streams_task.is_running():
                 self.check_twitch_streams_task.start()
-                print("TwitchNotificationsCog: Twitch stream checker task started via initialize_tasks.")
+                log.info("Twitch stream checker task started via initialize_tasks.")
             else:
-                print("TwitchNotificationsCog: Twitch stream checker task was already running when initialize_tasks was called.")
+                log.info("Twitch stream checker task was already running when initialize_tasks was called.")
+            if not self.refresh_twitch_identities_task.is_running():
+                self.refresh_twitch_identities_task.start()
+                log.info("Twitch identity refresh task started via initialize_tasks.")
         else:
-            print("TwitchNotificationsCog: initialize_tasks skipped starting task, Twitch features are DISABLED (missing client ID or secret).")
+            log.warning("initialize_tasks skipped starting task, Twitch features are DISABLED (missing client ID or secret).")
 
     async def cog_unload(self): # Changed to async def
+        # Runs on reloads and whenever the bot closes, including on SIGTERM and Ctrl+C (see main.py).
+        await self.shutdown()
+        log.info("Unloaded, Twitch stream checker and identity refresh tasks cancelled.")
+
+    async def shutdown(self, timeout: float = None):
+        """Stops polling, delivers queued notifications for up to `timeout` seconds, then saves state and closes connections.
+
+        A poll already in progress is allowed to finish first, so no stream is left announced but unrecorded.
+        Go-live announcements that could not be sent in time are marked offline before saving, and unsent
+        stream and clip summaries are saved to PENDING_SUMMARIES_FILE, so the next start sends them instead
+        of losing them. Only the first call does anything.
+        """
+        if self._shutting_down:
+            return
+        self._shutting_down = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (SHUTDOWN_TIMEOUT_SECONDS if timeout is None else timeout)
+        log.info("Shutting down Twitch notifications (%s queued deliveries)...", self.delivery_queue.depth)
+
+        self.refresh_twitch_identities_task.cancel()
+        try:
+            await asyncio.wait_for(self._poll_lock.acquire(), max(0, deadline - loop.time()))
+            self._poll_lock.release()
+        except asyncio.TimeoutError:
+            log.warning("Poll still running at the shutdown deadline, cancelling it.")
         self.check_twitch_streams_task.cancel()
-        print("TwitchNotificationsCog: Unloaded, Twitch stream checker task cancelled.")
+
+        if not await self.delivery_queue.drain(max(0, deadline - loop.time())):
+            retried = self._return_pending_announcements()
+            log.warning("Shutdown deadline reached with %s deliveries unsent; %s go-live announcement(s) and %s summaries "
+                        "will be sent after restart.", self.delivery_queue.depth, retried, len(self._pending_summaries))
+        self._save_pending_summaries()
+
+        _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
+        _save_json_data(self.guild_settings, SERVER_SETTINGS_FILE, "server settings")
+        _save_live_state_snapshot(self.guild_stream_registrations, saved_at=self.clock.time())
+        if self._http_session and not self._http_session.closed:
+            await self._http_session.close()
+        if self.helix_recorder:
+            self.helix_recorder.close()
+
+    def _return_pending_announcements(self):
+        """Marks streams whose announcement was never sent as offline, so they are announced again after a restart."""
+        returned = 0
+        for guild_id_str, twitch_user_id in self._pending_announcements:
+            details = self.guild_stream_registrations.get(guild_id_str, {}).get(twitch_user_id)
+            if details and details.get('last_live_status') and not details.get('last_message_id'):
+                details['last_live_status'] = False
+                returned += 1
+        self._pending_announcements.clear()
+        return returned
+
+    def _save_pending_summaries(self):
+        summaries = [{'priority': priority, 'channel_id': channel.id, 'embeds': [embed.to_dict() for embed in embeds],
+                      'sent_log': sent_log, 'login_name': login_name}
+                     for priority, channel, embeds, sent_log, login_name in self._pending_summaries.values()]
+        # _saved_summaries is only non-empty if the bot stops before it was ready to queue them again; keep those too.
+        _save_json_data({'summaries': self._saved_summaries + summaries}, PENDING_SUMMARIES_FILE, "pending summaries")
+
+    def _requeue_saved_summaries(self):
+        """Queues the summaries left unsent by the previous shutdown. Returns the number queued."""
+        if not self._saved_summaries:
+            return 0
+        requeued = 0
+        for summary in self._saved_summaries:
+            channel = self.bot.get_channel(summary.get('channel_id'))
+            if not channel or not isinstance(channel, discord.TextChannel):
+                continue
+            self._queue_summary(summary['priority'], channel, [discord.Embed.from_dict(d) for d in summary['embeds']],
+                                summary['sent_log'], summary['login_name'])
+            requeued += 1
+        log.info("Queued %s summaries left unsent by the last shutdown.", requeued)
+        self._saved_summaries = []
+        _save_json_data({'summaries': []}, PENDING_SUMMARIES_FILE, "pending summaries")
+        return requeued
+
+    async def _get_http_session(self):
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession()
+        return self._http_session
 
     # --- Twitch API Helper Functions ---
+    async def _helix_request(self, method: str, url: str, params=None, headers: dict = None, raise_for_status: bool = False):
+        """Sends one Twitch API request over the shared session. Returns (status, JSON body or None if not 200).
+
+        Every Helix and OAuth call goes through here, so traffic can be recorded with TWITCH_HELIX_RECORD,
+        including requests that fail with an error status, a timeout or a connection error.
+        """
+        session = await self._get_http_session()
+        started = self.clock.time()
+        send = session.post if method == 'POST' else session.get
+        status, data = None, None
+        try:
+            async with send(url, params=params, headers=headers) as response:
+                status = response.status
+                if raise_for_status:
+                    response.raise_for_status()
+                    status = 200
+                if status == 200:
+                    data = await response.json()
+        except Exception as e:
+            if self.helix_recorder:
+                self.helix_recorder.record(method, url, params, status, None, started, self.clock.time() - started,
+                                           error=type(e).__name__)
+            raise
+        if self.helix_recorder:
+            self.helix_recorder.record(method, url, params, status, data, started, self.clock.time() - started)
+        return status, data
+
     async def get_twitch_app_access_token(self):
         if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
             return None
-        if self.twitch_access_token and self.twitch_token_expires_at > (time.time() + 60):
+        if self.twitch_access_token and self.twitch_token_expires_at > (self.clock.time() + 60):
             return self.twitch_access_token
 
-        print("TwitchNotificationsCog: Requesting new Twitch App Access Token...")
-        token_url = 'https://id.twitch.tv/oauth2/token'
+        log.info("Requesting new Twitch App Access Token...")
+        token_url = f"{TWITCH_AUTH_BASE_URL}/token"
         params = {
             'client_id': TWITCH_CLIENT_ID,
             'client_secret': TWITCH_CLIENT_SECRET,
             'grant_type': 'client_credentials'
         }
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(token_url, params=params) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    if 'access_token' in data and 'expires_in' in data:
-                        self.twitch_access_token = data['access_token']
-                        self.twitch_token_expires_at = time.time() + data['expires_in']
-                        print("TwitchNotificationsCog: Successfully obtained new Twitch App Access Token.")
-                        return self.twitch_access_token
-                    else:
-                        print(f"TwitchNotificationsCog Error: Could not parse token or expiry from Twitch response: {data}")
-                        return None
-            except Exception as e:
-                print(f"TwitchNotificationsCog Error requesting Twitch App Access Token: {e}")
+        try:
+            _, data = await self._helix_request('POST', token_url, params=params, raise_for_status=True)
+            if 'access_token' in data and 'expires_in' in data:
+                self.twitch_access_token = data['access_token']
+                self.twitch_token_expires_at = self.clock.time() + data['expires_in']
+                log.info("Successfully obtained new Twitch App Access Token.")
+                return self.twitch_access_token
+            else:
+                log.error("Could not parse token or expiry from Twitch response: %s", data)
                 return None
+        except Exception as e:
+            log.error("Error requesting Twitch App Access Token: %s", e)
+            return None
 
     async def get_twitch_user_info(self, username: str):
         if not TWITCH_CLIENT_ID:
@@ -107,273 +400,693 @@ class TwitchNotificationsCog(commands.Cog):
         if not token:
             return None
 
-        url = f"https://api.twitch.tv/helix/users?login={username.lower()}"
+        url = f"{TWITCH_API_BASE_URL}/users"
         headers = {'Client-ID': TWITCH_CLIENT_ID, 'Authorization': f'Bearer {token}'}
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=headers) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    if data.get('data'):
-                        user_data = data['data'][0]
-                        return {"id": user_data['id'], "login": user_data['login'], "display_name": user_data['display_name']}
-                    return None
-            except Exception as e:
-                print(f"TwitchNotificationsCog Error fetching Twitch user info for {username}: {e}")
-                return None
+        try:
+            _, data = await self._helix_request('GET', url, params={'login': username.lower()}, headers=headers, raise_for_status=True)
+            if data.get('data'):
+                user_data = data['data'][0]
+                return {"id": user_data['id'], "login": user_data['login'], "display_name": user_data['display_name']}
+            return None
+        except Exception as e:
+            log.error("Error fetching Twitch user info for %s: %s", username, e)
+            return None
 
     async def get_twitch_user_profile(self, user_id: str, headers: dict):
-        url = f"https://api.twitch.tv/helix/users?id={user_id}"
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('data'):
-                            return data['data'][0]
-                    # Return None if response status is not 200 or data is not found
-                    return None
-            except Exception as e:
-                print(f"TwitchNotificationsCog Error fetching user profile: {e}")
+        url = f"{TWITCH_API_BASE_URL}/users"
+        try:
+            _, data = await self._helix_request('GET', url, params={'id': user_id}, headers=headers)
+            if data and data.get('data'):
+                return data['data'][0]
+            # Return None if response status is not 200 or data is not found
+            return None
+        except Exception as e:
+            log.error("Error fetching user profile: %s", e)
+            return None
+
+    async def get_twitch_users_by_ids(self, user_ids: list, headers: dict):
+        """Resolves up to IDENTITY_REFRESH_BATCH_SIZE broadcaster IDs with a single /users request.
+
+        Returns a dict of user ID -> Helix user data (IDs Twitch no longer knows about are absent, so a batch of
+        deleted accounts gives an empty dict), or None if the request failed.
+        """
+        if not user_ids:
+            return {}
+        url = f"{TWITCH_API_BASE_URL}/users"
+        params = [('id', user_id) for user_id in user_ids[:IDENTITY_REFRESH_BATCH_SIZE]]
+        try:
+            _, data = await self._helix_request('GET', url, params=params, headers=headers)
+            if data is None:
                 return None
+            return {user['id']: user for user in data.get('data', [])}
+        except Exception as e:
+            log.error("Error fetching user batch: %s", e)
+            return None
+
+    async def get_streams_by_user_ids(self, user_ids: list, headers: dict):
+        """Fetches the live streams of up to STREAMS_BATCH_SIZE broadcasters with a single /streams request.
+
+        Returns a dict of user ID -> stream data for the broadcasters that are live, or None if the request
+        failed (so a failure is never mistaken for everyone being offline).
+        """
+        if not user_ids:
+            return {}
+        url = f"{TWITCH_API_BASE_URL}/streams"
+        params = [('user_id', user_id) for user_id in user_ids[:STREAMS_BATCH_SIZE]]
+        params.append(('first', str(STREAMS_BATCH_SIZE)))
+        try:
+            _, data = await self._helix_request('GET', url, params=params, headers=headers)
+            if data is None:
+                return None
+            return {stream['user_id']: stream for stream in data.get('data', [])}
+        except Exception as e:
+            log.error("Error fetching stream batch: %s", e)
+            return None
 
     async def get_game_info(self, game_id: str, headers: dict):
         if not game_id:
             return None
-        url = f"https://api.twitch.tv/helix/games?id={game_id}"
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('data'):
-                            return data['data'][0]
-                    # Return None if response status is not 200 or data is not found
-                    return None
-            except Exception as e:
-                print(f"TwitchNotificationsCog Error fetching game info: {e}")
-                return None
+        url = f"{TWITCH_API_BASE_URL}/games"
+        try:
+            _, data = await self._helix_request('GET', url, params={'id': game_id}, headers=headers)
+            if data and data.get('data'):
+                return data['data'][0]
+            # Return None if response status is not 200 or data is not found
+            return None
+        except Exception as e:
+            log.error("Error fetching game info: %s", e)
+            return None
+
+    async def get_stream_clips(self, broadcaster_id: str, started_at: str, headers: dict, after: str = None):
+        """Fetches one page of clips created since `started_at`. Returns (clips, cursor for the next page or None)."""
+        url = f"{TWITCH_API_BASE_URL}/clips"
+        params = {'broadcaster_id': broadcaster_id, 'started_at': started_at, 'first': str(CLIP_PAGE_SIZE)}
+        if after:
+            params['after'] = after
+        try:
+            _, data = await self._helix_request('GET', url, params=params, headers=headers)
+            if data is None:
+                # Return empty list if status is not 200
+                return [], None
+            # Return empty list if 'data' is not in response
+            return data.get('data', []), data.get('pagination', {}).get('cursor')
+        except Exception as e:
+            log.error("Error fetching clips: %s", e)
+            return [], None
+
+    async def harvest_stream_clips(self, twitch_user_id: str, details: dict, headers: dict):
+        """Collects clips created since the last pass into `details`. Returns the number of new clips.
+
+        Clip IDs already seen are persisted in `seen_clip_ids`, so overlapping windows never
+        produce duplicates, and only the CLIP_SUMMARY_MAX_CLIPS most viewed clips are kept.
+        """
+        stream_start_ts = details.get('stream_start_timestamp')
+        if not stream_start_ts:
+            return 0
+        now = self.clock.time()
+        window_start = stream_start_ts
+        if details.get('last_clip_harvest_at'):
+            window_start = max(stream_start_ts, details['last_clip_harvest_at'] - CLIP_HARVEST_OVERLAP_SECONDS)
+        started_at = datetime.fromtimestamp(window_start, tz=dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        seen_clip_ids = set(details.get('seen_clip_ids') or [])
+        stream_clips = list(details.get('stream_clips') or [])
+        new_clips = 0
+        cursor = None
+        for _ in range(CLIP_MAX_PAGES_PER_HARVEST):
+            clips, cursor = await self.get_stream_clips(twitch_user_id, started_at, headers, after=cursor)
+            for clip in clips:
+                if not clip.get('id') or clip['id'] in seen_clip_ids:
+                    continue
+                seen_clip_ids.add(clip['id'])
+                stream_clips.append({
+                    'id': clip['id'], 'title': clip.get('title'), 'creator_name': clip.get('creator_name'),
+                    'view_count': clip.get('view_count', 0), 'url': clip.get('url')
+                })
+                new_clips += 1
+            if not cursor:
+                break
 
-    async def get_stream_clips(self, broadcaster_id: str, started_at: str, headers: dict):
-        url = f"https://api.twitch.tv/helix/clips?broadcaster_id={broadcaster_id}&started_at={started_at}&first=5"
-        async with aiohttp.ClientSession() as session:
+        stream_clips.sort(key=lambda clip: clip.get('view_count', 0), reverse=True)
+        details['stream_clips'] = stream_clips[:CLIP_SUMMARY_MAX_CLIPS]
+        details['seen_clip_ids'] = sorted(seen_clip_ids)
+        details['last_clip_harvest_at'] = now
+        return new_clips
+
+    def _same_stream_registrations(self, twitch_user_id: str, details: dict):
+        """Other guilds' registrations of the broadcaster that describe the same stream as `details`."""
+        stream_id = details.get('last_stream_id')
+        if not stream_id:
+            return []
+        return [other for streams in self.guild_stream_registrations.values()
+                for other in (streams.get(twitch_user_id),)
+                if other is not None and other is not details and other.get('last_stream_id') == stream_id]
+
+    def _adopt_clip_state(self, twitch_user_id: str, details: dict):
+        """Takes over the clip state of the most recently harvested registration of the same stream in another guild."""
+        freshest = max(self._same_stream_registrations(twitch_user_id, details),
+                       key=lambda other: other.get('last_clip_harvest_at') or 0, default=None)
+        if freshest and (freshest.get('last_clip_harvest_at') or 0) > (details.get('last_clip_harvest_at') or 0):
+            details.update({field: freshest.get(field) for field in CLIP_STATE_FIELDS})
+
+    async def send_clips_summary(self, guild_id_str: str, twitch_user_id: str, details: dict, headers: dict):
+        """Runs a final harvest pass and queues the deduplicated clips of the stream for the guild's clips channel.
+
+        The final pass runs once per stream: its result is handed to the other guilds' registrations of the
+        broadcaster, whose summaries then reuse it.
+        """
+        clips_channel_id = self.guild_settings.get(guild_id_str, {}).get('twitch_clips_channel_id')
+        if not clips_channel_id:
+            return
+        clips_channel = self.bot.get_channel(clips_channel_id)
+        if not clips_channel or not isinstance(clips_channel, discord.TextChannel):
+            return
+
+        if not details.get('clips_final_harvest_done'):
+            self._adopt_clip_state(twitch_user_id, details)
+            await self.harvest_stream_clips(twitch_user_id, details, headers)
+            details['clips_final_harvest_done'] = True
+            for other in self._same_stream_registrations(twitch_user_id, details):
+                other.update({field: details.get(field) for field in CLIP_STATE_FIELDS})
+        clips = details.get('stream_clips')
+        if not clips:
+            return
+
+        login_name = details.get('login_name', 'unknown')
+        clips_embed = discord.Embed(title=f"📎 Clips from {details.get('display_name', login_name)}'s stream",
+                                    description="Here are the clips created during the stream:",
+                                    color=discord.Color.purple())
+        for clip in clips:
+            clips_embed.add_field(name=f"👀 {clip.get('title') or 'Untitled Clip'}",
+                                  value=f"Created by: {clip.get('creator_name') or 'Unknown'}\nViews: {clip.get('view_count', 0)}\n[Watch Clip]({clip.get('url')})",
+                                  inline=False)
+        self._queue_summary(PRIORITY_CLIP_DIGEST, clips_channel, [clips_embed], "Sent clips summary for %s", login_name)
+
+    # --- Stream State Transitions ---
+    async def process_stream_status(self, guild_id_str: str, discord_channel: discord.TextChannel, twitch_user_id: str,
+                                    details: dict, stream_data: dict, headers: dict, offline_at: float = None):
+        """Applies one /streams result (`stream_data` is None when offline) to a registration and sends any notifications.
+
+        `offline_at` is the latest time the stream is known to have been live, used for the summary duration
+        when the end was not observed directly.
+        """
+        was_live = details.get('last_live_status', False)
+        listed_state = (was_live, details.get('last_game_name'))
+
+        if stream_data and was_live and details.get('last_stream_id') and stream_data.get('id') != details['last_stream_id']:
+            # A different stream than the one announced: the previous one ended unseen (e.g. while the bot was down).
+            await self._handle_stream_offline(guild_id_str, discord_channel, twitch_user_id, details, headers,
+                                              ended_at=_stream_started_timestamp(stream_data, self.clock.time()))
+            was_live = False
+
+        if stream_data:
+            await self._handle_stream_live(guild_id_str, discord_channel, twitch_user_id, details, stream_data, was_live, headers)
+        elif was_live:
+            await self._handle_stream_offline(guild_id_str, discord_channel, twitch_user_id, details, headers, ended_at=offline_at)
+        if (details.get('last_live_status', False), details.get('last_game_name')) != listed_state:
+            self._registrations_changed(guild_id_str)
+
+    async def _send_go_live(self, guild_id_str: str, discord_channel: discord.TextChannel, stream_embed: discord.Embed):
+        """Sends a go-live embed, merging it into the guild's open digest message when digest mode is enabled.
+
+        Returns (message, index of the embed within the message).
+        """
+        digest_seconds = self.guild_settings.get(guild_id_str, {}).get('twitch_digest_seconds', 0)
+        now = self.clock.time()
+        digest = self._go_live_digests.get(guild_id_str)
+        if digest_seconds and digest and digest['message'].channel.id == discord_channel.id \
+                and now - digest['opened_at'] <= digest_seconds \
+                and len(digest['embeds']) < DISCORD_MAX_EMBEDS_PER_MESSAGE \
+                and sum(len(e) for e in digest['embeds']) + len(stream_embed) <= DISCORD_MAX_EMBED_CHARACTERS:
             try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Return empty list if 'data' is not in response
-                        return data.get('data', [])
-                    # Return empty list if status is not 200
-                    return []
+                await digest['message'].edit(content="@everyone", embeds=digest['embeds'] + [stream_embed])
+                digest['embeds'].append(stream_embed)
+                return digest['message'], len(digest['embeds']) - 1
             except Exception as e:
-                print(f"TwitchNotificationsCog Error fetching clips: {e}")
-                return []
-
-    # --- Twitch Notification Task ---
-    @tasks.loop(minutes=1)
-    async def check_twitch_streams_task(self):
-        await self.bot.wait_until_ready()
-        if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
-            # This check might be redundant if task is not started, but good for safety
-            print("TwitchNotificationsCog: Twitch features disabled - missing credentials in task.")
+                log.error("Error adding to go-live digest, sending separately: %s", e)
+
+        message = await self.delivery.send(discord_channel, content="@everyone", embed=stream_embed)
+        if digest_seconds:
+            self._go_live_digests[guild_id_str] = {'message': message, 'embeds': [stream_embed], 'opened_at': now}
+        return message, 0
+
+    def _sync_go_live_digest(self, guild_id_str: str, message_id: int, embed_index: int, embed: discord.Embed):
+        """Keeps the open digest's embeds in step with in-place edits, so the next merge doesn't revert them."""
+        digest = self._go_live_digests.get(guild_id_str)
+        if digest and digest['message'].id == message_id and embed_index < len(digest['embeds']):
+            digest['embeds'][embed_index] = embed
+
+    def _is_current_stream(self, guild_id_str: str, twitch_user_id: str, details: dict, stream_id: str):
+        """True while `details` is still registered and still describes stream `stream_id` (checked by queued jobs)."""
+        return self.guild_stream_registrations.get(guild_id_str, {}).get(twitch_user_id) is details \
+            and details.get('last_stream_id') == stream_id
+
+    async def _deliver_go_live(self, guild_id_str: str, discord_channel: discord.TextChannel, twitch_user_id: str,
+                               details: dict, stream_id: str, stream_embed: discord.Embed):
+        login_name = details.get('login_name', 'unknown')
+        try:
+            if not self._is_current_stream(guild_id_str, twitch_user_id, details, stream_id):
+                return # Ended or unregistered before the announcement was delivered
+            message, embed_index = await self._send_go_live(guild_id_str, discord_channel, stream_embed)
+        except Exception as e:
+            log.error("Error sending notification: %s", e)
             return
-        if not self.guild_stream_registrations:
-            # print("TwitchNotificationsCog: No stream registrations found in task.") # Can be noisy
+        finally:
+            self._pending_announcements.discard((guild_id_str, twitch_user_id))
+        details['last_message_id'] = message.id
+        details['last_message_embed_index'] = embed_index
+        details['last_message_via_webhook'] = self.delivery.sent_via_webhook(message)
+        _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
+        log.info("Sent live notification for %s", login_name)
+
+    @staticmethod
+    def _render_live_embed(embed: discord.Embed, details: dict):
+        """Updates a go-live embed in place with the latest title, game and viewer count of `details`."""
+        login_name = details.get('login_name', 'unknown')
+        current_title = details.get('last_title') or 'No Title'
+        current_game_name = details.get('last_game_name') or 'No Game'
+        current_viewers = details.get('last_viewer_count', 0)
+        description_lines = (embed.description or "").split('\n')
+        if not description_lines[0].endswith(current_title):
+            description_lines[0] = f"**{current_title}**"
+
+        for i, line in enumerate(description_lines):
+            if "🎮 Playing:" in line and line != f"🎮 Playing: **{current_game_name}**":
+                description_lines[i] = f"🎮 Playing: **{current_game_name}**"
+                embed.title = f"{details.get('display_name', login_name)} is playing {current_game_name}!"
+                if details.get('last_box_art_url'):
+                    embed.set_image(url=details['last_box_art_url'])
+
+        for i, line in enumerate(description_lines):
+            if "👥 Current Viewers:" in line: description_lines[i] = f"👥 Current Viewers: **{current_viewers}**"
+        embed.description = '\n'.join(description_lines)
+
+    async def _edit_live_message(self, guild_id_str: str, discord_channel: discord.TextChannel, message_id: int):
+        """Re-renders every live embed of one message from the latest stream state with a single fetch and edit.
+
+        A digest message carries several streams; they all share this job, so a newer edit always replaces an older one.
+        """
+        live = [details for details in self.guild_stream_registrations.get(guild_id_str, {}).values()
+                if details.get('last_live_status') and details.get('last_message_id') == message_id]
+        if not live:
+            return # Every stream in the message ended or was unregistered before the edit was delivered
+        try:
+            message = await self.delivery.fetch_message(discord_channel, message_id, live[0].get('last_message_via_webhook'))
+            if not message:
+                return
+            embeds = message.embeds
+            for details in live:
+                embed_index = details.get('last_message_embed_index') or 0
+                if embed_index < len(embeds):
+                    self._render_live_embed(embeds[embed_index], details)
+            await message.edit(content="@everyone", embeds=embeds)
+            for details in live:
+                embed_index = details.get('last_message_embed_index') or 0
+                if embed_index < len(embeds):
+                    self._sync_go_live_digest(guild_id_str, message.id, embed_index, embeds[embed_index])
+        except Exception as e:
+            log.error("Error updating live message %s (%s): %s", message_id,
+                      ", ".join(details.get('login_name', 'unknown') for details in live), e)
+
+    async def _handle_stream_live(self, guild_id_str: str, discord_channel: discord.TextChannel, twitch_user_id: str,
+                                  details: dict, stream_data: dict, was_live: bool, headers: dict):
+        login_name = details.get('login_name', 'unknown')
+        stream_id = stream_data.get('id')
+        current_viewers = stream_data.get('viewer_count', 0)
+        current_game_id = stream_data.get('game_id')
+        current_game_name = stream_data.get('game_name', 'No Game')
+
+        if was_live and not details.get('last_message_id') and (guild_id_str, twitch_user_id) not in self._pending_announcements:
+            # Recorded as live but never announced: the queued go-live was lost (crash or kill before it was sent)
+            # or failed to send. Announce it now rather than leaving the stream unannounced.
+            was_live = False
+
+        if was_live:
+            if current_game_id != details.get('last_game_id'):
+                game_info = await self.get_game_info(current_game_id, headers)
+                details['last_box_art_url'] = _box_art_url(game_info)
+            if details.get('last_message_id'):
+                # Only the newest edit of a message matters; it supersedes any older one still queued, including
+                # those queued for other streams of the same digest message.
+                self.delivery_queue.submit(
+                    PRIORITY_VIEWER_EDIT,
+                    functools.partial(self._edit_live_message, guild_id_str, discord_channel, details['last_message_id']),
+                    coalesce_key=('live_edit', guild_id_str, details['last_message_id']))
+        else:
+            user_profile = await self.get_twitch_user_profile(twitch_user_id, headers)
+            game_info = await self.get_game_info(current_game_id, headers)
+            details['stream_start_timestamp'] = _stream_started_timestamp(stream_data, self.clock.time())
+            details['last_thumbnail_url'] = stream_data.get('thumbnail_url')
+            details['last_box_art_url'] = _box_art_url(game_info)
+
+            stream_embed = discord.Embed(
+                title=f"{details.get('display_name', login_name)} is now live on Twitch!",
+                description=f"**{stream_data.get('title', 'No Title')}**\n\n"
+                          f"🎮 Playing: **{current_game_name}**\n"
+                          f"👥 Current Viewers: **{current_viewers}**",
+                url=f"https://twitch.tv/{login_name}", color=discord.Color.purple()
+            )
+            if details['last_box_art_url']:
+                stream_embed.set_image(url=details['last_box_art_url'])
+            if user_profile and user_profile.get('profile_image_url'):
+                stream_embed.set_thumbnail(url=user_profile['profile_image_url'])
+
+            self.delivery_queue.submit(
+                PRIORITY_GO_LIVE,
+                functools.partial(self._deliver_go_live, guild_id_str, discord_channel, twitch_user_id, details, stream_id, stream_embed))
+            self._pending_announcements.add((guild_id_str, twitch_user_id))
+
+        details['last_live_status'] = True
+        details['last_stream_id'] = stream_id
+        details['last_game_name'] = current_game_name
+        details['last_game_id'] = current_game_id
+        details['last_title'] = stream_data.get('title', 'No Title')
+        details['last_viewer_count'] = current_viewers
+        self._sample_viewers(details, current_viewers)
+
+        if self.guild_settings.get(guild_id_str, {}).get('twitch_clips_channel_id'):
+            # Another guild following the broadcaster may already have harvested this stream during this pass.
+            self._adopt_clip_state(twitch_user_id, details)
+            last_harvest = details.get('last_clip_harvest_at') or 0
+            if self.clock.time() - last_harvest >= CLIP_HARVEST_INTERVAL_SECONDS:
+                await self.harvest_stream_clips(twitch_user_id, details, headers)
+        _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
+
+    def _sample_viewers(self, details: dict, viewers: int):
+        """Adds a polled viewer count to the stream's stats, at most once per VIEWER_SAMPLE_SECONDS.
+
+        Each broadcaster is polled every POLL_INTERVAL_SECONDS give or take a slot, hence the half-slot tolerance.
+        """
+        now = self.clock.time()
+        last_sample = details.get('last_viewer_sample_at')
+        if last_sample and now - last_sample + self.poll_wheel.slot_seconds / 2 < VIEWER_SAMPLE_SECONDS:
             return
+        add_viewer_sample(details, viewers)
+        details['last_viewer_sample_at'] = now
+
+    def _queue_summary(self, priority: int, channel: discord.TextChannel, embeds: list, sent_log: str, login_name: str):
+        """Queues a stream or clip summary, keeping track of it until it is sent so a shutdown can save it."""
+        summary_id = next(self._summary_ids)
+        self._pending_summaries[summary_id] = (priority, channel, embeds, sent_log, login_name)
+        self.delivery_queue.submit(
+            priority, functools.partial(self._deliver_embeds, channel, embeds, sent_log, login_name, summary_id))
+
+    async def _deliver_embeds(self, channel: discord.TextChannel, embeds: list, sent_log: str, login_name: str,
+                              summary_id: int = None):
+        """Sends each embed as its own message, stopping at the first failure. `sent_log` is a %-template for the login."""
+        try:
+            for embed in embeds:
+                await self.delivery.send(channel, embed=embed)
+            log.info(sent_log, login_name)
+        except Exception as e:
+            log.error("Error delivering notification for %s: %s", login_name, e)
+        finally:
+            self._pending_summaries.pop(summary_id, None)
+
+    async def _handle_stream_offline(self, guild_id_str: str, discord_channel: discord.TextChannel, twitch_user_id: str,
+                                     details: dict, headers: dict, ended_at: float = None):
+        """Queues the stream summary and resets the registration. `ended_at` defaults to now."""
+        login_name = details.get('login_name', 'unknown')
+        log.info("Stream went offline: %s", login_name)
+        duration_text = ""
+        if details.get('stream_start_timestamp'):
+            duration = max(0, (ended_at or self.clock.time()) - details.get('stream_start_timestamp'))
+            hours, minutes = int(duration // 3600), int((duration % 3600) // 60)
+            duration_text = f"Stream Duration: **{hours}h {minutes}m**"
+
+        embed = discord.Embed(
+            title=f"📺 {details.get('display_name', login_name)} has ended their stream",
+            description=f"**Stream Summary**\n\n{duration_text}\n"
+                       f"Peak Viewers: **{details.get('peak_viewers', 0)}**\n"
+                       f"Average Viewers: **{details.get('avg_viewers', 0)}**\n"
+                       f"Median Viewers: **{details.get('median_viewers', 0)}**\n"
+                       f"Last Game: **{details.get('last_game_name', 'N/A')}**\n\n"
+                       f"Thanks for watching! 👋", color=discord.Color.dark_grey()
+        )
+        user_profile = await self.get_twitch_user_profile(twitch_user_id, headers)
+        if user_profile and user_profile.get('profile_image_url'):
+            embed.set_thumbnail(url=user_profile['profile_image_url'])
+
+        summary_embeds = []
+        if details.get('last_game_id'):
+            game_info = await self.get_game_info(details['last_game_id'], headers)
+            box_art_url = _box_art_url(game_info)
+            if box_art_url:
+                game_embed = discord.Embed(color=discord.Color.dark_grey())
+                game_embed.set_image(url=box_art_url)
+                summary_embeds.append(game_embed)
+
+        if details.get('last_thumbnail_url'):
+            thumb_url = details['last_thumbnail_url'].replace('{width}', '1280').replace('{height}', '720')
+            stream_preview_embed = discord.Embed(color=discord.Color.dark_grey())
+            stream_preview_embed.set_image(url=f"{thumb_url}?t={int(self.clock.time())}")
+            summary_embeds.append(stream_preview_embed)
+
+        embed.set_footer(text="Stream Ended")
+        embed.timestamp = self.clock.now()
+        summary_embeds.append(embed)
+        self._queue_summary(PRIORITY_OFFLINE_SUMMARY, discord_channel, summary_embeds, "Sent offline notification for %s", login_name)
+
+        # Collect clips before the reset below clears the stream start and harvested clips.
+        await self.send_clips_summary(guild_id_str, twitch_user_id, details, headers)
+
+        details.update({
+            'last_live_status': False, 'stream_start_timestamp': None,
+            'last_stream_id': None, 'last_message_id': None, 'last_message_embed_index': 0,
+            'last_message_via_webhook': None,
+            'peak_viewers': 0, 'avg_viewers': 0,
+            'total_viewers': 0, 'viewer_count_samples': 0,
+            'median_viewers': 0, 'viewer_median_sketch': None, 'last_viewer_sample_at': None,
+            'seen_clip_ids': [], 'stream_clips': [], 'last_clip_harvest_at': None, 'clips_final_harvest_done': False
+        })  # Reset more stats
+        _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
 
+    def _registrations_changed(self, guild_id_str: str):
+        """Discards cached notifylist pages of a guild after a registration was added, removed, renamed or changed status."""
+        self._notifylist_cache.pop(guild_id_str, None)
+
+    def _login_index(self, guild_id_str: str) -> LoginIndex:
+        if guild_id_str not in self._login_indexes:
+            self._login_indexes[guild_id_str] = LoginIndex(self.guild_stream_registrations.get(guild_id_str))
+        return self._login_indexes[guild_id_str]
+
+    def _get_notification_channel(self, guild_id_str: str):
+        notification_channel_id = self.guild_settings.get(guild_id_str, {}).get('twitch_notification_channel_id')
+        if not notification_channel_id:
+            log.debug("No notification channel set for guild %s", guild_id_str)
+            return None
+
+        discord_channel = self.bot.get_channel(notification_channel_id)
+        if not discord_channel:
+            log.warning("Could not find channel %s for guild %s", notification_channel_id, guild_id_str)
+            return None
+        if not isinstance(discord_channel, discord.TextChannel):
+            log.warning("Channel %s for guild %s is not a TextChannel, skipping.", notification_channel_id, guild_id_str)
+            return None
+        return discord_channel
+
+    # --- Warm Restart ---
+    async def reconcile_live_state(self):
+        """Checks every registered broadcaster with batched /streams queries and applies the transitions missed while down.
+
+        Streams that are still live with the same stream ID keep their existing announcement, so a restart
+        never re-announces them. Returns the number of broadcasters reconciled.
+        """
+        if not self.guild_stream_registrations:
+            return 0
         token = await self.get_twitch_app_access_token()
         if not token:
-            print("TwitchNotificationsCog Poll: Failed to get token.")
-            return
-
-        # print("TwitchNotificationsCog: --- Starting Twitch stream check ---") # Can be noisy
+            log.error("Reconcile: Failed to get token.")
+            return 0
         headers = {'Client-ID': TWITCH_CLIENT_ID, 'Authorization': f'Bearer {token}'}
 
-        for guild_id_str, streams in list(self.guild_stream_registrations.items()):
-            notification_channel_id = self.guild_settings.get(guild_id_str, {}).get('twitch_notification_channel_id')
-            if not notification_channel_id:
-                # print(f"TwitchNotificationsCog: No notification channel set for guild {guild_id_str}")
-                continue
+        all_ids = sorted({tid for streams in self.guild_stream_registrations.values() for tid in streams})
+        live_streams = {}
+        checked_ids = set()
+        for i in range(0, len(all_ids), STREAMS_BATCH_SIZE):
+            batch = all_ids[i:i + STREAMS_BATCH_SIZE]
+            streams = await self.get_streams_by_user_ids(batch, headers)
+            if streams is None:
+                continue # Left to the normal poll cycle
+            live_streams.update(streams)
+            checked_ids.update(batch)
 
-            discord_channel = self.bot.get_channel(notification_channel_id)
+        for guild_id_str, streams in list(self.guild_stream_registrations.items()):
+            discord_channel = self._get_notification_channel(guild_id_str)
             if not discord_channel:
-                print(f"TwitchNotificationsCog: Could not find channel {notification_channel_id} for guild {guild_id_str}")
                 continue
-            if not isinstance(discord_channel, discord.TextChannel):
-                print(f"TwitchNotificationsCog: Channel {notification_channel_id} for guild {guild_id_str} is not a TextChannel, skipping.")
-                continue
-
             for twitch_user_id, details in list(streams.items()):
-                login_name = details.get('login_name', 'unknown')
-                # print(f"TwitchNotificationsCog: Checking stream status for {login_name} (ID: {twitch_user_id})")
-
-                url = f"https://api.twitch.tv/helix/streams?user_id={twitch_user_id}"
+                if twitch_user_id not in checked_ids:
+                    continue
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, headers=headers) as resp:
-                            # print(f"TwitchNotificationsCog: API response status for {login_name}: {resp.status}")
-                            if resp.status == 200:
-                                api_resp = await resp.json()
-                                # print(f"TwitchNotificationsCog: API response for {login_name}: {api_resp}")
-
-                                is_live_now = bool(api_resp.get('data'))
-                                was_live = details.get('last_live_status', False)
-
-                                if is_live_now:
-                                    stream_data = api_resp['data'][0]
-                                    current_viewers = stream_data.get('viewer_count', 0)
-                                    current_game_id = stream_data.get('game_id')
-                                    current_game_name = stream_data.get('game_name', 'No Game')
-
-                                    if was_live and details.get('last_message_id'):
-                                        try:
-                                            message = await discord_channel.fetch_message(details['last_message_id'])
-                                            if message:
-                                                updated_embed = message.embeds[0]
-                                                current_title = stream_data.get('title', 'No Title')
-                                                description_lines = (updated_embed.description or "").split('\n')
-                                                if not description_lines[0].endswith(current_title):
-                                                    description_lines[0] = f"**{current_title}**"
-
-                                                if current_game_id != details.get('last_game_id'):
-                                                    game_info = await self.get_game_info(current_game_id, headers)
-                                                    updated_embed.title = f"{details.get('display_name', login_name)} is playing {current_game_name}!"
-                                                    for i, line in enumerate(description_lines):
-                                                        if "🎮 Playing:" in line: description_lines[i] = f"🎮 Playing: **{current_game_name}**"
-                                                    if game_info and game_info.get('box_art_url'):
-                                                        box_art_url = game_info['box_art_url'].replace('{width}', '285').replace('{height}', '380')
-                                                        updated_embed.set_image(url=box_art_url)
-                                                    details['last_game_id'] = current_game_id
-                                                    details['last_game_name'] = current_game_name
-
-                                                for i, line in enumerate(description_lines):
-                                                    if "👥 Current Viewers:" in line: description_lines[i] = f"👥 Current Viewers: **{current_viewers}**"
-                                                updated_embed.description = '\n'.join(description_lines)
-                                                await message.edit(content="@everyone", embed=updated_embed)
-
-                                                if current_viewers > details.get('peak_viewers', 0): details['peak_viewers'] = current_viewers
-                                                details['total_viewers'] = details.get('total_viewers', 0) + current_viewers
-                                                details['viewer_count_samples'] = details.get('viewer_count_samples', 0) + 1
-                                                details['avg_viewers'] = round(details['total_viewers'] / details['viewer_count_samples'])
-                                                _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
-                                        except Exception as e:
-                                            print(f"TwitchNotificationsCog Error updating live message for {login_name}: {e}")
-
-                                    elif not was_live:
-                                        user_profile = await self.get_twitch_user_profile(twitch_user_id, headers)
-                                        game_info = await self.get_game_info(current_game_id, headers)
-                                        details['stream_start_timestamp'] = datetime.now().timestamp()
-                                        details['last_thumbnail_url'] = stream_data.get('thumbnail_url')
-
-                                        stream_embed = discord.Embed(
-                                            title=f"{details.get('display_name', login_name)} is now live on Twitch!",
-                                            description=f"**{stream_data.get('title', 'No Title')}**\n\n"
-                                                      f"🎮 Playing: **{current_game_name}**\n"
-                                                      f"👥 Current Viewers: **{current_viewers}**",
-                                            url=f"https://twitch.tv/{login_name}", color=discord.Color.purple()
-                                        )
-                                        if game_info and game_info.get('box_art_url'):
-                                            box_art_url = game_info['box_art_url'].replace('{width}', '285').replace('{height}', '380')
-                                            stream_embed.set_image(url=box_art_url)
-                                        if user_profile and user_profile.get('profile_image_url'):
-                                            stream_embed.set_thumbnail(url=user_profile['profile_image_url'])
-
-                                        try:
-                                            message = await discord_channel.send(content="@everyone", embed=stream_embed)
-                                            details['last_message_id'] = message.id
-                                            print(f"TwitchNotificationsCog: Sent live notification for {login_name}")
-                                        except Exception as e:
-                                            print(f"TwitchNotificationsCog Error sending notification: {e}")
-
-                                    details['last_live_status'] = True
-                                    details['last_stream_id'] = stream_data.get('id')
-                                    details['last_game_name'] = current_game_name
-                                    details['last_game_id'] = current_game_id
-                                    # details['stream_start_time'] = time.time() # Already have stream_start_timestamp
-                                    _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
-
-                                elif not is_live_now and was_live:
-                                    print(f"TwitchNotificationsCog: Stream went offline: {login_name}")
-                                    duration_text = ""
-                                    if details.get('stream_start_timestamp'):
-                                        duration = time.time() - details.get('stream_start_timestamp')
-                                        hours, minutes = int(duration // 3600), int((duration % 3600) // 60)
-                                        duration_text = f"Stream Duration: **{hours}h {minutes}m**"
-
-                                    embed = discord.Embed(
-                                        title=f"📺 {details.get('display_name', login_name)} has ended their stream",
-                                        description=f"**Stream Summary**\n\n{duration_text}\n"
-                                                   f"Peak Viewers: **{details.get('peak_viewers', 0)}**\n"
-                                                   f"Average Viewers: **{details.get('avg_viewers', 0)}**\n"
-                                                   f"Last Game: **{details.get('last_game_name', 'N/A')}**\n\n"
-                                                   f"Thanks for watching! 👋", color=discord.Color.dark_grey()
-                                    )
-                                    user_profile = await self.get_twitch_user_profile(twitch_user_id, headers)
-                                    if user_profile and user_profile.get('profile_image_url'):
-                                        embed.set_thumbnail(url=user_profile['profile_image_url'])
-
-                                    if details.get('last_game_id'):
-                                        game_info = await self.get_game_info(details['last_game_id'], headers)
-                                        if game_info and game_info.get('box_art_url'):
-                                            game_embed = discord.Embed(color=discord.Color.dark_grey())
-                                            box_art_url = game_info['box_art_url'].replace('{width}', '285').replace('{height}', '380')
-                                            game_embed.set_image(url=box_art_url)
-                                            await discord_channel.send(embed=game_embed)
-
-                                    if details.get('last_thumbnail_url'):
-                                        thumb_url = details['last_thumbnail_url'].replace('{width}', '1280').replace('{height}', '720')
-                                        stream_preview_embed = discord.Embed(color=discord.Color.dark_grey())
-                                        stream_preview_embed.set_image(url=f"{thumb_url}?t={int(time.time())}")
-                                        await discord_channel.send(embed=stream_preview_embed)
-
-                                    embed.set_footer(text="Stream Ended")
-                                    embed.timestamp = datetime.now()
-
-                                    try:
-                                        await discord_channel.send(embed=embed)
-                                        print(f"TwitchNotificationsCog: Sent offline notification for {login_name}")
-                                    except Exception as e:
-                                        print(f"TwitchNotificationsCog Error sending offline notification: {e}")
-
-                                    details.update({
-                                        'last_live_status': False, 'stream_start_timestamp': None,
-                                        'last_stream_id': None, 'last_message_id': None,
-                                        'peak_viewers': 0, 'avg_viewers': 0,
-                                        'total_viewers': 0, 'viewer_count_samples': 0
-                                    })  # Reset more stats
-                                    _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
-
-                                    clips_channel_id = self.guild_settings.get(guild_id_str, {}).get('twitch_clips_channel_id')
-                                    if clips_channel_id:
-                                        clips_channel = self.bot.get_channel(clips_channel_id)
-                                        if clips_channel and isinstance(clips_channel, discord.TextChannel):
-                                            stream_start_ts = details.get('stream_start_timestamp')
-                                            start_time_iso = None
-                                            if stream_start_ts:
-                                                start_time_iso = datetime.fromtimestamp(stream_start_ts).isoformat() + 'Z'
-
-                                            if start_time_iso: # Only fetch clips if we have a valid start time
-                                                clips = await self.get_stream_clips(twitch_user_id, start_time_iso, headers)
-                                                if clips:
-                                                    clips_embed = discord.Embed(title=f"📎 Clips from {details.get('display_name', login_name)}'s stream",
-                                                                                description="Here are the clips created during the stream:",
-                                                                                color=discord.Color.purple())
-                                                    for clip in clips:
-                                                        clips_embed.add_field(name=f"👀 {clip.get('title', 'Untitled Clip')}",
-                                                                            value=f"Created by: {clip.get('creator_name', 'Unknown')}\nViews: {clip.get('view_count', 0)}\n[Watch Clip]({clip.get('url')})",
-                                                                            inline=False)
-                                                    try:
-                                                        await clips_channel.send(embed=clips_embed)
-                                                        print(f"TwitchNotificationsCog: Sent clips summary for {login_name}")
-                                                    except Exception as e:
-                                                        print(f"TwitchNotificationsCog Error sending clips: {e}")
+                    await self.process_stream_status(guild_id_str, discord_channel, twitch_user_id, details,
+                                                     live_streams.get(twitch_user_id), headers,
+                                                     offline_at=self.last_known_live_at)
                 except Exception as e:
-                    print(f"TwitchNotificationsCog Error checking {login_name}: {e}")
+                    log.error("Error reconciling %s: %s", details.get('login_name', 'unknown'), e)
+
+        _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
+        _save_live_state_snapshot(self.guild_stream_registrations, saved_at=self.clock.time())
+        log.info("Reconciled %s broadcaster(s) in %s batched request(s).", len(checked_ids), math.ceil(len(all_ids) / STREAMS_BATCH_SIZE))
+        return len(checked_ids)
+
+    # --- Twitch Notification Task ---
+    def _broadcaster_registrations(self):
+        """Groups registrations by broadcaster ID, so each broadcaster is queried once however many guilds follow it."""
+        by_broadcaster = {}
+        for guild_id_str, streams in self.guild_stream_registrations.items():
+            for twitch_user_id in streams:
+                by_broadcaster.setdefault(twitch_user_id, []).append(guild_id_str)
+        return by_broadcaster
+
+    async def poll_wheel_slot(self):
+        """Polls the broadcasters in the timing wheel's current slot with batched /streams requests.
+
+        Returns the number of broadcasters checked.
+        """
+        slot = self.poll_wheel.advance(self.clock.time())
+        by_broadcaster = self._broadcaster_registrations()
+        due_ids = self.poll_wheel.keys_for_slot(slot, by_broadcaster.keys())
+        if not due_ids:
+            return 0
+
+        token = await self.get_twitch_app_access_token()
+        if not token:
+            log.error("Poll: Failed to get token.")
+            return 0
+        headers = {'Client-ID': TWITCH_CLIENT_ID, 'Authorization': f'Bearer {token}'}
+
+        started = self.clock.monotonic()
+        checked = 0
+        for i in range(0, len(due_ids), STREAMS_BATCH_SIZE):
+            batch = due_ids[i:i + STREAMS_BATCH_SIZE]
+            live_streams = await self.get_streams_by_user_ids(batch, headers)
+            if live_streams is None:
+                continue # Try again next revolution rather than treating everyone as offline
+            for twitch_user_id in batch:
+                for guild_id_str in by_broadcaster[twitch_user_id]:
+                    details = self.guild_stream_registrations.get(guild_id_str, {}).get(twitch_user_id)
+                    discord_channel = self._get_notification_channel(guild_id_str)
+                    if details is None or not discord_channel:
+                        continue
+                    try:
+                        await self.process_stream_status(guild_id_str, discord_channel, twitch_user_id, details,
+                                                         live_streams.get(twitch_user_id), headers)
+                    except Exception as e:
+                        log.error("Error checking %s: %s", details.get('login_name', 'unknown'), e)
+                checked += 1
+        self.poll_wheel.record_slot_duration(slot, self.clock.monotonic() - started)
+        return checked
+
+    async def run_poll_tick(self):
+        """One tick of the poll loop, once per poll wheel slot (driven by the task below, or by simulation.py)."""
+        if not self.guild_stream_registrations:
+            log.debug("No stream registrations found in task.")
+            return
+        if self._shutting_down:
+            return
+
+        async with self._poll_lock:
+            # Each tick polls one slot of the wheel, so every broadcaster is still checked once per POLL_INTERVAL_SECONDS.
+            await self.poll_wheel_slot()
+            if self.poll_wheel.current_slot == 0:
+                # A full revolution just completed; snapshot live state once per interval rather than every slot.
+                _save_live_state_snapshot(self.guild_stream_registrations, saved_at=self.clock.time())
+
+    @tasks.loop(seconds=POLL_SLOT_SECONDS)
+    async def check_twitch_streams_task(self):
+        await self.bot.wait_until_ready()
+        if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
+            # This check might be redundant if task is not started, but good for safety
+            log.warning("Twitch features disabled - missing credentials in task.")
+            return
+        await self.run_poll_tick()
 
     @check_twitch_streams_task.before_loop
     async def before_check_twitch_streams_task(self):
         await self.bot.wait_until_ready()
-        print("TwitchNotificationsCog: `check_twitch_streams_task` waiting for bot readiness.")
+        log.debug("`check_twitch_streams_task` waiting for bot readiness.")
+        if not self._reconciled:
+            # Catch up on transitions missed while the bot was down before normal polling begins.
+            async with self._poll_lock:
+                self._requeue_saved_summaries()
+                await self.reconcile_live_state()
+            self._reconciled = True
+
+    # --- Identity Refresh Task ---
+    def _apply_identity_update(self, twitch_user_id: str, login_name: str, display_name: str):
+        """Updates every guild's registration of a broadcaster in place. Returns True if anything changed."""
+        changed = False
+        for guild_id_str, streams in self.guild_stream_registrations.items():
+            details = streams.get(twitch_user_id)
+            if not details:
+                continue
+            if details.get('login_name') != login_name or details.get('display_name') != display_name:
+                log.info("Twitch user %s renamed from %s to %s, updating registration.", twitch_user_id, details.get('login_name'), login_name)
+                if guild_id_str in self._login_indexes:
+                    self._login_indexes[guild_id_str].rename(details.get('login_name', ''), login_name, twitch_user_id)
+                self._registrations_changed(guild_id_str)
+                details['login_name'] = login_name
+                details['display_name'] = display_name
+                changed = True
+        return changed
+
+    @staticmethod
+    def _identity_refresh_interval(num_batches: int) -> float:
+        # Spread one full pass over the refresh cycle instead of resolving everyone at once.
+        return max(IDENTITY_REFRESH_MIN_INTERVAL_SECONDS, IDENTITY_REFRESH_CYCLE_SECONDS / max(num_batches, 1))
+
+    async def refresh_identity_batch(self):
+        """Re-resolves the batch of registered broadcaster IDs due now and stores any name changes.
+
+        The batch is picked from the clock (one per refresh interval, cycling through all of them), so a pass
+        keeps making progress across restarts instead of starting over at the first batch on every boot.
+        Returns the number of batches needed to cover every registered broadcaster, or None if the batch
+        could not be fetched and should be retried soon.
+        """
+        all_ids = sorted({tid for streams in self.guild_stream_registrations.values() for tid in streams})
+        if not all_ids:
+            return 0
+        num_batches = math.ceil(len(all_ids) / IDENTITY_REFRESH_BATCH_SIZE)
+        batch_index = int(self.clock.time() // self._identity_refresh_interval(num_batches)) % num_batches
+        batch = all_ids[batch_index * IDENTITY_REFRESH_BATCH_SIZE:(batch_index + 1) * IDENTITY_REFRESH_BATCH_SIZE]
+
+        token = await self.get_twitch_app_access_token()
+        if not token:
+            log.error("Identity refresh: Failed to get token.")
+            return None
+        headers = {'Client-ID': TWITCH_CLIENT_ID, 'Authorization': f'Bearer {token}'}
+
+        users = await self.get_twitch_users_by_ids(batch, headers)
+        if users is None:
+            return None # Retried shortly, which still falls within this batch's interval
+
+        changed = False
+        for tid, user in users.items():
+            if self._apply_identity_update(tid, user.get('login'), user.get('display_name')):
+                changed = True
+        if changed:
+            _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
+        return num_batches
+
+    async def run_identity_refresh(self):
+        """Refreshes one batch and returns the number of seconds until the next one."""
+        num_batches = await self.refresh_identity_batch()
+        if num_batches is None:
+            return IDENTITY_REFRESH_RETRY_SECONDS
+        return self._identity_refresh_interval(num_batches)
+
+    @tasks.loop(seconds=IDENTITY_REFRESH_MIN_INTERVAL_SECONDS)
+    async def refresh_twitch_identities_task(self):
+        if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
+            return
+        interval = await self.run_identity_refresh()
+        if self.refresh_twitch_identities_task.seconds != interval:
+            self.refresh_twitch_identities_task.change_interval(seconds=interval)
+
+    @refresh_twitch_identities_task.before_loop
+    async def before_refresh_twitch_identities_task(self):
+        await self.bot.wait_until_ready()
 
     # --- Admin Commands ---
     @twitch_admin_group.command(name="set_channel", description="Sets the channel for Twitch live notifications.")
@@ -399,7 +1112,7 @@ class TwitchNotificationsCog(commands.Cog):
             await interaction.response.send_message("You need 'Manage Server' permissions.", ephemeral=True)
         else:
             await interaction.response.send_message(f"An error occurred: {str(error)[:1800]}", ephemeral=True)
-            print(f"TwitchNotificationsCog Error in /twitchadmin set_channel: {error}")
+            log.error("Error in /twitchadmin set_channel: %s", error)
 
     @twitch_admin_group.command(name="set_clips_channel", description="Sets the channel for Twitch clips.")
     @app_commands.describe(clips_channel="The channel for Twitch clips.")
@@ -418,6 +1131,40 @@ class TwitchNotificationsCog(commands.Cog):
         _save_json_data(self.guild_settings, SERVER_SETTINGS_FILE, "server settings")
         await interaction.response.send_message(f"Twitch clips will be sent to {clips_channel.mention}.", ephemeral=True)
 
+    @twitch_admin_group.command(name="set_digest", description="Merges go-live notifications arriving close together into one message.")
+    @app_commands.describe(seconds=f"Digest window in seconds (0 sends every notification separately, max {MAX_DIGEST_SECONDS}).")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def set_twitch_digest(self, interaction: discord.Interaction, seconds: app_commands.Range[int, 0, MAX_DIGEST_SECONDS]):
+        if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
+            await interaction.response.send_message("Twitch features are not configured.", ephemeral=True)
+            return
+        if not interaction.guild_id:
+            await interaction.response.send_message("This command must be used in a server.", ephemeral=True)
+            return
+
+        guild_id_str = str(interaction.guild_id)
+        if guild_id_str not in self.guild_settings: self.guild_settings[guild_id_str] = {}
+        self.guild_settings[guild_id_str]['twitch_digest_seconds'] = seconds
+        _save_json_data(self.guild_settings, SERVER_SETTINGS_FILE, "server settings")
+        if seconds:
+            await interaction.response.send_message(f"Go-live notifications within {seconds}s of each other will be merged "
+                                                    f"into one message (up to {DISCORD_MAX_EMBEDS_PER_MESSAGE} streams).", ephemeral=True)
+        else:
+            self._go_live_digests.pop(guild_id_str, None)
+            await interaction.response.send_message("Go-live notifications will be sent separately.", ephemeral=True)
+
+    @twitch_admin_group.command(name="delivery_stats", description="Shows the Twitch notification delivery queue status.")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def twitch_delivery_stats(self, interaction: discord.Interaction):
+        stats = self.delivery_queue.stats()
+        embed = discord.Embed(title="Twitch Notification Delivery", color=discord.Color.purple())
+        embed.description = (f"Queued: **{stats['depth']}**\n"
+                             f"Delivered: **{stats['processed']}**\n"
+                             f"Superseded by newer updates: **{stats['superseded']}**\n"
+                             f"Dropped under load: **{stats['dropped']}**\n"
+                             f"Failed: **{stats['failed']}**")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     # --- User Commands ---
     @twitch_user_group.command(name="notifyadd", description="Register a Twitch channel for live notifications.")
     @app_commands.describe(twitch_username="Your Twitch username.")
@@ -451,13 +1198,17 @@ class TwitchNotificationsCog(commands.Cog):
             "last_live_status": False, "last_stream_id": None, "last_game_name": None,
             "last_game_id": None, "stream_start_timestamp": None, "last_thumbnail_url": None, # Initialize new fields
             "peak_viewers": 0, "avg_viewers": 0, "total_viewers": 0, "viewer_count_samples": 0, # Initialize stats
+            "median_viewers": 0, "viewer_median_sketch": None, "last_viewer_sample_at": None,
+            "seen_clip_ids": [], "stream_clips": [], "last_clip_harvest_at": None, # Incremental clip harvesting
             "registered_by": interaction.user.id
         }
+        self._login_index(guild_id_str).add(tlogin, tid)
+        self._registrations_changed(guild_id_str)
         _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
         await interaction.followup.send(f"`{tdisplay}` (`{tlogin}`) registered for notifications!")
 
     @twitch_user_group.command(name="notifyremove", description="Unregister a Twitch channel from notifications.")
-    @app_commands.describe(twitch_username="Twitch username to unregister.")
+    @app_commands.describe(twitch_username="Twitch username to unregister (start typing to search).")
     async def twitch_notify_remove(self, interaction: discord.Interaction, twitch_username: str):
         if not interaction.guild_id:
             await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
@@ -474,24 +1225,128 @@ class TwitchNotificationsCog(commands.Cog):
             await interaction.followup.send(f"`{twitch_username}` not found in registrations for this server.")
             return
 
-        found_id = None
-        removed_display = uname_lower
-        for tid, details in self.guild_stream_registrations[gid_str].items():
-            if details.get('login_name','').lower() == uname_lower:
-                found_id = tid
-                removed_display = details.get('display_name', uname_lower)
-                break
+        login_index = self._login_index(gid_str)
+        found_id = login_index.find(uname_lower)
 
         if found_id:
+            removed_display = self.guild_stream_registrations[gid_str][found_id].get('display_name', uname_lower)
             del self.guild_stream_registrations[gid_str][found_id]
-            if not self.guild_stream_registrations[gid_str]: del self.guild_stream_registrations[gid_str]
+            login_index.remove(uname_lower, found_id)
+            self._registrations_changed(gid_str)
+            if not self.guild_stream_registrations[gid_str]:
+                del self.guild_stream_registrations[gid_str]
+                del self._login_indexes[gid_str]
             _save_json_data(self.guild_stream_registrations, STREAM_REGISTRATIONS_FILE, "stream registrations")
             await interaction.followup.send(f"`{removed_display}` unregistered from notifications.")
         else:
             await interaction.followup.send(f"`{twitch_username}` not found in registrations for this server.")
 
+    @twitch_notify_remove.autocomplete('twitch_username')
+    async def twitch_notify_remove_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self._registered_login_choices(interaction, current)
+
+    def _registered_login_choices(self, interaction: discord.Interaction, current: str):
+        """Autocomplete choices for the guild's registered logins starting with `current`, served from the login index."""
+        if not interaction.guild_id:
+            return []
+        gid_str = str(interaction.guild_id)
+        streams = self.guild_stream_registrations.get(gid_str, {})
+        return [app_commands.Choice(name=f"{streams.get(tid, {}).get('display_name', login_name)} ({login_name})", value=login_name)
+                for login_name, tid in self._login_index(gid_str).complete(current.strip(), AUTOCOMPLETE_MAX_CHOICES)]
+
+    @twitch_user_group.command(name="notifylookup", description="Shows the notification status of a registered Twitch channel.")
+    @app_commands.describe(twitch_username="Registered Twitch username (start typing to search).")
+    async def twitch_notify_lookup(self, interaction: discord.Interaction, twitch_username: str):
+        if not interaction.guild_id:
+            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+            return
+        if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
+            await interaction.response.send_message("Twitch features are not configured on this bot.", ephemeral=True)
+            return
+
+        gid_str = str(interaction.guild_id)
+        tid = self._login_index(gid_str).find(twitch_username.strip()) if gid_str in self.guild_stream_registrations else None
+        if not tid:
+            await interaction.response.send_message(f"`{twitch_username}` not found in registrations for this server.", ephemeral=True)
+            return
+
+        d = self.guild_stream_registrations[gid_str][tid]
+        login_name = d.get('login_name', 'id:' + tid)
+        embed = discord.Embed(title=f"{d.get('display_name', login_name)} (`{login_name}`)",
+                              url=f"https://twitch.tv/{login_name}", color=discord.Color.purple())
+        if d.get('last_live_status'):
+            lines = [f"Status: **Live** since <t:{int(d.get('stream_start_timestamp') or 0)}:R>",
+                     f"**{d.get('last_title') or 'No Title'}**",
+                     f"🎮 Playing: **{d.get('last_game_name') or 'No Game'}**",
+                     f"👥 Current Viewers: **{d.get('last_viewer_count', 0)}**"]
+        else:
+            lines = ["Status: Offline"]
+            if d.get('last_game_name'):
+                lines.append(f"Last Game: **{d['last_game_name']}**")
+        if d.get('registered_by'):
+            lines.append(f"Registered by: <@{d['registered_by']}>")
+        embed.description = "\n".join(lines)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @twitch_notify_lookup.autocomplete('twitch_username')
+    async def twitch_notify_lookup_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self._registered_login_choices(interaction, current)
+
+    def _notifylist_ids(self, gid_str: str, filters: tuple) -> list:
+        """Broadcaster IDs matching (live_only, lowercase game text), in login order, cached until registrations change."""
+        cache = self._notifylist_cache.setdefault(gid_str, {'ids': {}, 'pages': {}})
+        if filters not in cache['ids']:
+            live_only, game = filters
+            streams = self.guild_stream_registrations.get(gid_str, {})
+            ids = []
+            for _, tid in self._login_index(gid_str):
+                d = streams.get(tid, {})
+                if live_only and not d.get('last_live_status'):
+                    continue
+                if game and game not in (d.get('last_game_name') or '').lower():
+                    continue
+                ids.append(tid)
+            cache['ids'][filters] = ids
+        return cache['ids'][filters]
+
+    def render_notifylist_page(self, gid_str: str, guild_name: str, live_only: bool, game: str, page: int):
+        """Renders one notifylist page. Returns (embed, page shown, total pages); `page` is clamped to the valid range.
+
+        Only the requested page is formatted, and formatted pages are cached until the guild's registrations change.
+        """
+        filters = (live_only, (game or '').strip().lower())
+        if any(filters):
+            ids = self._notifylist_ids(gid_str, filters)
+            total = len(ids)
+        else:
+            ids = None # Unfiltered pages are sliced straight out of the login index
+            total = len(self._login_index(gid_str))
+        total_pages = max(1, math.ceil(total / NOTIFYLIST_PAGE_SIZE))
+        page = min(max(page, 0), total_pages - 1)
+
+        pages = self._notifylist_cache.setdefault(gid_str, {'ids': {}, 'pages': {}})['pages']
+        if (filters, page) not in pages:
+            start, stop = page * NOTIFYLIST_PAGE_SIZE, (page + 1) * NOTIFYLIST_PAGE_SIZE
+            page_ids = ids[start:stop] if ids is not None else [tid for _, tid in self._login_index(gid_str).page(start, stop)]
+            streams = self.guild_stream_registrations.get(gid_str, {})
+            lines = []
+            for tid in page_ids:
+                d = streams.get(tid, {})
+                status = f"Live ({d.get('last_game_name') or 'No Game'})" if d.get('last_live_status') else 'Offline'
+                lines.append(f"- **{d.get('display_name', 'N/A')}** (`{d.get('login_name', 'id:'+tid)}`) - Status: {status}")
+            if len(pages) >= NOTIFYLIST_MAX_CACHED_PAGES:
+                del pages[next(iter(pages))]
+            pages[(filters, page)] = "\n".join(lines) if lines else "No registered channels match these filters."
+
+        embed = discord.Embed(title=f"Twitch Notifications for {guild_name}", color=discord.Color.purple(),
+                              description=pages[(filters, page)])
+        embed.set_footer(text=f"Page {page + 1}/{total_pages} · {total} channel(s)")
+        return embed, page, total_pages
+
     @twitch_user_group.command(name="notifylist", description="Lists Twitch channels registered for notifications.")
-    async def twitch_notify_list(self, interaction: discord.Interaction):
+    @app_commands.describe(live_only="Only show channels that are live right now.",
+                           game="Only show channels whose current or last game contains this text.")
+    async def twitch_notify_list(self, interaction: discord.Interaction, live_only: bool = False, game: str = None):
         if not interaction.guild_id:
             await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
             return
@@ -505,16 +1360,17 @@ class TwitchNotificationsCog(commands.Cog):
             return
 
         guild_name = interaction.guild.name if interaction.guild else "this server"
-        embed = discord.Embed(title=f"Twitch Notifications for {guild_name}", color=discord.Color.purple())
-        lines = [f"- **{d.get('display_name', 'N/A')}** (`{d.get('login_name', 'id:'+tid)}`) - Status: {'Live' if d.get('last_live_status') else 'Offline'}"
-                 for tid, d in self.guild_stream_registrations[gid_str].items()]
-        embed.description = "\n".join(lines) if lines else "No channels registered."
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-
+        render_page = functools.partial(self.render_notifylist_page, gid_str, guild_name, live_only, game)
+        embed, page, total_pages = render_page(0)
+        if total_pages > 1:
+            view = NotifyListView(render_page, interaction.user.id, page, total_pages)
+            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
 
 async def setup(bot: commands.Bot):
     if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
-        print("Error: Twitch Notifications Cog not loaded. TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET not set in .env.")
+        log.error("Twitch Notifications Cog not loaded. TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET not set in .env.")
     else:
         # Add the command groups to the bot's tree before adding the cog
         # This ensures they are registered correctly.
@@ -531,4 +1387,4 @@ async def setup(bot: commands.Bot):
         cog = TwitchNotificationsCog(bot)
         await bot.add_cog(cog)
         await cog.initialize_tasks() # Initialize tasks after adding the cog
-        print("TwitchNotificationsCog added and tasks initialized.")
+        log.info("TwitchNotificationsCog added and tasks initialized.")
@@ -0,0 +1,90 @@
+import math
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile with the P² algorithm (Jain & Chlamtac, 1985).
+
+    Five markers track the minimum, the quantile, the maximum and two points in between, so memory is
+    constant however many samples arrive. `state` is a plain dict that can be stored in the registrations
+    JSON and passed back in to continue the estimate after a restart.
+    """
+
+    def __init__(self, p: float, state: dict = None):
+        self.p = p
+        if state and state.get('p') == p:
+            self.count = state['count']
+            self.q = list(state['q'])
+            self.n = list(state.get('n') or [])
+            self.np = list(state.get('np') or [])
+        else:
+            self.count = 0
+            self.q = [] # Marker heights; the first five samples, sorted, until the markers are initialised
+            self.n = [] # Marker positions
+            self.np = [] # Desired marker positions
+        self._dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    @property
+    def state(self) -> dict:
+        return {'p': self.p, 'count': self.count, 'q': self.q, 'n': self.n, 'np': self.np}
+
+    def add(self, x: float):
+        self.count += 1
+        if self.count <= 5:
+            self.q.append(x)
+            self.q.sort()
+            if self.count == 5:
+                self.n = [0, 1, 2, 3, 4]
+                self.np = [0, 2 * self.p, 4 * self.p, 2 + 2 * self.p, 4]
+            return
+
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self._dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                q[i] = candidate if q[i - 1] < candidate < q[i + 1] else self._linear(i, d)
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i: int, d: int) -> float:
+        q, n = self.q, self.n
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def value(self) -> float:
+        """The current estimate (exact while there are five samples or fewer), or 0 with no samples."""
+        if not self.count:
+            return 0
+        if self.count < 5:
+            return self.q[min(len(self.q) - 1, max(0, math.ceil(self.p * len(self.q)) - 1))]
+        return self.q[2]
+
+
+def add_viewer_sample(details: dict, viewers: int):
+    """Folds one viewer count into a registration's stream stats: peak, running mean and a median sketch."""
+    details['peak_viewers'] = max(details.get('peak_viewers') or 0, viewers)
+    details['total_viewers'] = (details.get('total_viewers') or 0) + viewers
+    details['viewer_count_samples'] = (details.get('viewer_count_samples') or 0) + 1
+    details['avg_viewers'] = round(details['total_viewers'] / details['viewer_count_samples'])
+    median = P2Quantile(0.5, details.get('viewer_median_sketch'))
+    median.add(viewers)
+    details['viewer_median_sketch'] = median.state
+    details['median_viewers'] = round(median.value())
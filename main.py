@@ -1,13 +1,26 @@
 
+import time
+BOOT_STARTED = time.perf_counter() # Taken before the imports below, so the startup report includes them
+
 import discord
 from discord.ext import commands
+import asyncio
 import os
+import signal
 import sys
 from dotenv import load_dotenv
 from discord import app_commands # For CommandTree
 
+from bot_logging import configure_logging, get_logger
+from runtime_profile import StartupTimer, apply_runtime_profile, freeze_startup_heap
+
+startup_timer = StartupTimer(started=BOOT_STARTED)
+startup_timer.mark("imports")
+
 # Load environment variables from .env file at the very start
 load_dotenv()
+configure_logging() # LOG_LEVEL / LOG_FORMAT come from .env too
+log = get_logger("main")
 
 # --- Configuration from Environment Variables ---
 BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
@@ -16,25 +29,25 @@ USER_ID_STR = os.getenv('DISCORD_USER_ID')     # For name changer
 
 # Validate core bot configuration
 if not BOT_TOKEN:
-    print("Error: DISCORD_BOT_TOKEN environment variable not set.", file=sys.stderr)
+    log.error("DISCORD_BOT_TOKEN environment variable not set.")
     sys.exit(1)
 if not SERVER_ID_STR:
-    print("Error: DISCORD_SERVER_ID (for name changer) environment variable not set.", file=sys.stderr)
+    log.error("DISCORD_SERVER_ID (for name changer) environment variable not set.")
     sys.exit(1) # Assuming name changer is a core feature that needs its config
 if not USER_ID_STR:
-    print("Error: DISCORD_USER_ID (for name changer) environment variable not set.", file=sys.stderr)
+    log.error("DISCORD_USER_ID (for name changer) environment variable not set.")
     sys.exit(1) # Assuming name changer is a core feature
 
 try:
     int(SERVER_ID_STR) # Validate that it's an integer
 except ValueError:
-    print("Error: DISCORD_SERVER_ID environment variable is not a valid integer.", file=sys.stderr)
+    log.error("DISCORD_SERVER_ID environment variable is not a valid integer.")
     sys.exit(1)
 
 try:
     int(USER_ID_STR) # Validate that it's an integer
 except ValueError:
-    print("Error: DISCORD_USER_ID environment variable is not a valid integer.", file=sys.stderr)
+    log.error("DISCORD_USER_ID environment variable is not a valid integer.")
     sys.exit(1)
 
 # Twitch Configuration (Optional - features disabled if not set)
@@ -43,7 +56,11 @@ TWITCH_CLIENT_ID = os.getenv('TWITCH_CLIENT_ID')
 TWITCH_CLIENT_SECRET = os.getenv('TWITCH_CLIENT_SECRET')
 
 if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
-    print("Warning: TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET not set. Twitch features will be disabled in cogs.", file=sys.stderr)
+    log.warning("TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET not set. Twitch features will be disabled in cogs.")
+
+# BOT_RUNTIME_PROFILE=performance: uvloop (if installed), tuned GC and a frozen startup heap. See runtime_profile.py.
+RUNTIME_PROFILE = apply_runtime_profile()
+startup_timer.mark("configuration")
 
 # --- Bot Intents and Initialization ---
 intents = discord.Intents.default()
@@ -57,29 +74,46 @@ class CustomBot(commands.Bot):
             help_command=None,  # Disable the default help command
             intents=intents
         )
+        self._close_task = None # Started by SIGTERM
 
     async def setup_hook(self):
-        print("Running setup_hook...")
+        log.debug("Running setup_hook...")
+        # SIGTERM (docker stop, systemd, rolling restarts) closes the bot the way Ctrl+C does. Closing unloads
+        # every cog first, which lets the Twitch cog deliver queued notifications and save its state.
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._on_sigterm)
+        except (NotImplementedError, AttributeError):
+            pass # Signal handlers are not supported by the Windows event loop
         # setup_hook is called before on_ready.
         # Cog loading and other async setup can happen here or in on_ready.
         # For this project, load_extensions is called in on_ready.
         pass
 
+    def _on_sigterm(self):
+        log.info("Received SIGTERM, shutting down...")
+        self._close_task = asyncio.get_running_loop().create_task(self.close())
+
     async def load_extensions(self):
-        print("Loading extensions...")
-        extensions = [
-            "cogs.name_changer.name_changer_cog",
-            "cogs.twitch_notifications.twitch_notifications_cog"
-        ]
+        log.info("Loading extensions...")
+        extensions = ["cogs.name_changer.name_changer_cog"]
+        # Extensions (and their imports) are only loaded when their feature is configured.
+        if TWITCH_CLIENT_ID and TWITCH_CLIENT_SECRET:
+            extensions.append("cogs.twitch_notifications.twitch_notifications_cog")
+        else:
+            log.info("Twitch is not configured, skipping the Twitch notifications extension.")
         for extension in extensions:
+            if extension in self.extensions:
+                continue # on_ready runs again after a reconnect
             try:
                 await self.load_extension(extension)
-                print(f"Loaded {extension} successfully.")
+                startup_timer.mark(f"load {extension.rsplit('.', 1)[-1]}")
+                log.info("Loaded %s successfully.", extension)
             except Exception as e:
-                print(f"Failed to load extension {extension}: {e}", file=sys.stderr)
+                log.error("Failed to load extension %s: %s", extension, e)
 
 # Create bot instance after all command definitions
 bot = CustomBot()
+_startup_reported = False
 
 # Features below are moved to cogs
 # --- Twitch API Helper Functions ---
@@ -89,27 +123,30 @@ bot = CustomBot()
 # --- Event: Bot Ready ---
 @bot.event
 async def on_ready():
+    global _startup_reported
+    if not _startup_reported:
+        startup_timer.mark("connect to Discord")
     # User attribute check as per your feedback
     if bot.user is not None:
-        print(f'Bot logged in as {bot.user.name}')
+        log.info("Bot logged in as %s", bot.user.name)
     else:
-        print('Bot user object is None at on_ready. This is unexpected.')
+        log.error("Bot user object is None at on_ready. This is unexpected.")
         return # Cannot proceed without bot.user
 
-    # Diagnostic prints for commands are here (before sync)
-    print("--- Diagnosing commands in bot.tree before sync ---")
+    # Diagnostic logging for commands is here (before sync)
+    log.debug("--- Diagnosing commands in bot.tree before sync ---")
     # It's better to call load_extensions before diagnosing the tree,
     # so commands from cogs are included in the diagnostic.
     await bot.load_extensions() # Changed from self.load_extensions to bot.load_extensions
 
     all_commands_on_tree = bot.tree.get_commands()
-    print(f"Total top-level items found in bot.tree: {len(all_commands_on_tree)}")
+    log.debug("Total top-level items found in bot.tree: %s", len(all_commands_on_tree))
     for cmd_or_group in all_commands_on_tree:
-        print(f"  Item: {cmd_or_group.name}, Type: {type(cmd_or_group)}")
+        log.debug("  Item: %s, Type: %s", cmd_or_group.name, type(cmd_or_group))
         if isinstance(cmd_or_group, app_commands.Group):
             group_sub_commands = cmd_or_group.commands
-            print(f"    Sub-commands in group '{cmd_or_group.name}': {[c.name for c in group_sub_commands]}")
-    print("--- End diagnostic prints ---")
+            log.debug("    Sub-commands in group '%s': %s", cmd_or_group.name, [c.name for c in group_sub_commands])
+    log.debug("--- End diagnostics ---")
 
     # Sync slash commands
     try:
@@ -118,27 +155,35 @@ async def on_ready():
         if guild_id_env:
             try:
                 guild_obj = discord.Object(id=int(guild_id_env))
-                print(f"Attempting to sync to specific guild: {guild_id_env}")
+                log.info("Attempting to sync to specific guild: %s", guild_id_env)
                 bot.tree.copy_global_to(guild=guild_obj)
                 synced = await bot.tree.sync(guild=guild_obj)
-                print(f"Synced {len(synced)} slash command(s) to guild {guild_id_env}.")
+                log.info("Synced %s slash command(s) to guild %s.", len(synced), guild_id_env)
             except ValueError:
-                print(f"Error: DISCORD_TEST_GUILD_ID ('{guild_id_env}') is not a valid integer. Falling back to global sync.")
+                log.error("DISCORD_TEST_GUILD_ID ('%s') is not a valid integer. Falling back to global sync.", guild_id_env)
                 synced = await bot.tree.sync()
-                print(f"Synced {len(synced)} slash command(s) globally (due to invalid test guild ID).")
+                log.info("Synced %s slash command(s) globally (due to invalid test guild ID).", len(synced))
         else:
-            print("Attempting to sync commands globally...")
+            log.info("Attempting to sync commands globally...")
             synced = await bot.tree.sync()
-            print(f"Synced {len(synced)} slash command(s) globally.")
+            log.info("Synced %s slash command(s) globally.", len(synced))
     except Exception as e:
-        print(f"Failed to sync slash commands: {e}")
+        log.error("Failed to sync slash commands: %s", e)
+
+    if not _startup_reported:
+        _startup_reported = True
+        startup_timer.mark("command sync")
+        if RUNTIME_PROFILE == 'performance':
+            log.info("Froze %s startup objects out of garbage collection.", freeze_startup_heap())
+        startup_timer.log_report(log)
 
 # --- Slash Command Definitions ---
 # All slash commands now live in their respective cogs.
 
 # Add this at the very bottom of the file
 if __name__ == "__main__":
-    print("Starting bot...")
+    log.info("Starting bot...")
     # Ensure the bot instance has the load_extensions method if it's called in on_ready or setup_hook
     # For CustomBot, it's part of its methods.
-    bot.run(BOT_TOKEN)
+    # log_handler=None: discord.py logs through our queue-backed handler instead of installing its own.
+    bot.run(BOT_TOKEN, log_handler=None)
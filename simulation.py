@@ -0,0 +1,429 @@
+"""Runs both cogs for simulated days or weeks under a virtual clock, in seconds of real time.
+
+A synthetic stream-activity model stands in for Twitch (answering the cog's Helix requests), and fake
+Discord channels record every notification. The report covers notification latency (time from a stream
+starting or ending to its Discord message), API calls per endpoint, delivery queue counters and how
+much persisted state grows per simulated day.
+
+    python simulation.py --days 14 --streamers 300 --guilds 5 --follows 120
+
+Use it to compare scheduler, polling or cache changes: run before and after, same --seed, and diff the reports.
+"""
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import discord
+
+from bot_clock import VirtualClock, VirtualScheduler
+from bot_logging import configure_logging, get_logger
+from cogs.name_changer import name_changer_cog
+from cogs.twitch_notifications import twitch_notifications_cog as twitch_cog
+
+log = get_logger("simulation")
+
+# Simulations start at a fixed instant, so runs with the same seed are identical.
+SIMULATION_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+SIMULATED_GAMES = 20
+
+
+def _rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    pick = lambda fraction: round(values[min(len(values) - 1, int(fraction * len(values)))], 1)
+    return {'count': len(values), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(values[-1], 1)}
+
+
+class SyntheticStreamModel:
+    """Stream schedules for `num_streamers` broadcasters over [start, end), drawn from a seeded RNG.
+
+    Each broadcaster streams a few times a week to a few times a day, for 20 minutes to 12 hours, with a
+    heavy-tailed audience size, an occasional mid-stream game change, and clips made in proportion to viewers.
+    """
+
+    def __init__(self, num_streamers: int, start: float, end: float, seed: int = 0):
+        rng = random.Random(seed)
+        self.user_ids = [str(100000 + i) for i in range(num_streamers)]
+        self.logins = {tid: f"sim_streamer_{i:04d}" for i, tid in enumerate(self.user_ids)}
+        self.by_login = {login: tid for tid, login in self.logins.items()}
+        self.by_display_name = {self.display_name(tid): tid for tid in self.user_ids}
+        self._sessions = {} # user ID -> sessions sorted by start
+        self._session_starts = {}
+        stream_ids = iter(range(1, 10 ** 9))
+        for tid in self.user_ids:
+            streams_per_day = rng.uniform(0.2, 1.5)
+            audience = int(rng.paretovariate(1.2) * 5)
+            sessions = []
+            t = start + rng.expovariate(streams_per_day / 86400)
+            while t < end:
+                length = min(12 * 3600, max(20 * 60, rng.gauss(3 * 3600, 1.5 * 3600)))
+                games = [(0, str(rng.randrange(SIMULATED_GAMES)))]
+                if rng.random() < 0.3:
+                    games.append((length / 2, str(rng.randrange(SIMULATED_GAMES))))
+                clips = sorted(t + rng.uniform(0, length) for _ in range(min(50, audience // 20)))
+                sessions.append({'id': str(next(stream_ids)), 'start': t, 'end': t + length, 'viewers': audience,
+                                 'games': games, 'clips': clips, 'title': f"Stream #{len(sessions) + 1}"})
+                t += length + rng.expovariate(streams_per_day / 86400)
+            self._sessions[tid] = sessions
+            self._session_starts[tid] = [s['start'] for s in sessions]
+
+    def display_name(self, user_id: str) -> str:
+        return self.logins[user_id].replace('sim_streamer_', 'SimStreamer')
+
+    def latest_session(self, user_id: str, at: float):
+        """The session that started most recently at or before `at`, or None."""
+        index = bisect.bisect_right(self._session_starts.get(user_id, []), at) - 1
+        return self._sessions[user_id][index] if index >= 0 else None
+
+    def sessions(self, user_id: str) -> list:
+        return self._sessions.get(user_id, [])
+
+    def stream_data(self, user_id: str, at: float):
+        """Helix /streams data for the broadcaster at `at`, or None while offline."""
+        session = self.latest_session(user_id, at)
+        if session is None or at >= session['end']:
+            return None
+        elapsed = at - session['start']
+        game_id = [game for offset, game in session['games'] if offset <= elapsed][-1]
+        ramp = min(1.0, elapsed / 1800) # Audiences build up over the first half hour
+        login = self.logins[user_id]
+        return {'id': session['id'], 'user_id': user_id, 'user_login': login, 'user_name': self.display_name(user_id),
+                'game_id': game_id, 'game_name': f"Game {game_id}", 'type': 'live', 'title': session['title'],
+                'viewer_count': int(session['viewers'] * ramp), 'started_at': _rfc3339(session['start']),
+                'thumbnail_url': f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{login}-{{width}}x{{height}}.jpg"}
+
+    def clips(self, user_id: str, since: float, until: float) -> list:
+        session = self.latest_session(user_id, until)
+        if session is None:
+            return []
+        return [{'id': f"{session['id']}-{i}", 'title': f"Clip {i}", 'creator_name': 'viewer', 'view_count': i,
+                 'url': f"https://clips.twitch.tv/{session['id']}-{i}", 'created_at': _rfc3339(created)}
+                for i, created in enumerate(session['clips']) if since <= created <= until]
+
+
+class SimulatedHelix:
+    """Answers the cog's Helix and OAuth requests from the stream model. Install with `cog._helix_request = helix.request`."""
+
+    def __init__(self, model: SyntheticStreamModel, clock: VirtualClock, latency: float = 0.1,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.model = model
+        self.clock = clock
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = {} # endpoint -> requests
+        self.errors = 0
+        self._rng = random.Random(seed)
+
+    async def request(self, method: str, url: str, params=None, headers: dict = None, raise_for_status: bool = False):
+        endpoint = urlsplit(url).path.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        self.clock.advance(self.latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            if raise_for_status:
+                raise RuntimeError(f"Simulated 500 from /{endpoint}")
+            return 500, None
+
+        items = list(params.items() if isinstance(params, dict) else params or [])
+        values = lambda key: [str(v) for k, v in items if k == key]
+        now = self.clock.time()
+        if endpoint == 'token':
+            return 200, {'access_token': 'simulated-token', 'expires_in': 4 * 3600, 'token_type': 'bearer'}
+        if endpoint == 'users':
+            ids = values('id') + [self.model.by_login[login] for login in values('login') if login in self.model.by_login]
+            return 200, {'data': [{'id': tid, 'login': self.model.logins[tid], 'display_name': self.model.display_name(tid),
+                                   'profile_image_url': f"https://static-cdn.jtvnw.net/{tid}.png"}
+                                  for tid in ids if tid in self.model.logins]}
+        if endpoint == 'streams':
+            streams = [self.model.stream_data(tid, now) for tid in values('user_id')]
+            return 200, {'data': [stream for stream in streams if stream], 'pagination': {}}
+        if endpoint == 'games':
+            return 200, {'data': [{'id': game_id, 'name': f"Game {game_id}",
+                                   'box_art_url': f"https://static-cdn.jtvnw.net/ttv-boxart/{game_id}-{{width}}x{{height}}.jpg"}
+                                  for game_id in values('id')]}
+        if endpoint == 'clips':
+            since = datetime.strptime(values('started_at')[0], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+            clips = self.model.clips(values('broadcaster_id')[0], since, now)
+            offset = int((values('after') or ['0'])[0])
+            page_size = int((values('first') or ['20'])[0])
+            cursor = str(offset + page_size) if offset + page_size < len(clips) else None
+            return 200, {'data': clips[offset:offset + page_size], 'pagination': {'cursor': cursor} if cursor else {}}
+        return 404, None
+
+
+class SimulationMetrics:
+    """Collects what the fake Discord objects see: notifications, edits and their latency."""
+
+    def __init__(self, model: SyntheticStreamModel, clock: VirtualClock):
+        self.model = model
+        self.clock = clock
+        self.go_live_latencies = []
+        self.offline_latencies = []
+        self.announced = {} # (guild ID, user ID, stream ID) -> announcements
+        self.counts = {'go_live': 0, 'offline_summary': 0, 'clip_summary': 0, 'digest_merges': 0, 'edits': 0,
+                       'messages': 0, 'nickname_changes': 0}
+        self.nickname_change_times = []
+
+    def on_embeds(self, guild_id: str, content, embeds: list, merged: bool = False):
+        for embed in embeds:
+            if content == "@everyone" and embed.url and embed.url.startswith('https://twitch.tv/'):
+                tid = self.model.by_login.get(embed.url.rsplit('/', 1)[-1])
+                session = self.model.latest_session(tid, self.clock.time())
+                self.counts['go_live'] += 1
+                self.counts['digest_merges'] += merged
+                if session is not None:
+                    self.go_live_latencies.append(self.clock.time() - session['start'])
+                    key = (guild_id, tid, session['id'])
+                    self.announced[key] = self.announced.get(key, 0) + 1
+            elif embed.title and embed.title.endswith(' has ended their stream'):
+                tid = self.model.by_display_name.get(embed.title[2:-len(' has ended their stream')])
+                session = self.model.latest_session(tid, self.clock.time())
+                self.counts['offline_summary'] += 1
+                if session is not None and self.clock.time() >= session['end']:
+                    self.offline_latencies.append(self.clock.time() - session['end'])
+            elif embed.title and embed.title.startswith('📎 Clips'):
+                self.counts['clip_summary'] += 1
+
+
+class SimulatedMessage:
+    def __init__(self, message_id: int, channel, content, embeds: list):
+        self.id = message_id
+        self.channel = channel
+        self.content = content
+        self.embeds = list(embeds)
+
+    async def edit(self, content=None, embed=None, embeds=None):
+        channel = self.channel
+        channel.clock.advance(channel.latency)
+        embeds = [embed] if embed is not None else list(embeds or [])
+        if len(embeds) > len(self.embeds):
+            channel.metrics.on_embeds(channel.guild_id, content, embeds[len(self.embeds):], merged=True)
+        else:
+            channel.metrics.counts['edits'] += 1
+        self.content = content
+        self.embeds = embeds
+
+
+class SimulatedChannel(discord.TextChannel):
+    """A text channel that keeps its messages in memory. Subclasses TextChannel only to pass the cog's isinstance checks."""
+
+    def __init__(self, channel_id: int, guild_id: str, clock: VirtualClock, metrics: SimulationMetrics, latency: float):
+        # TextChannel's own initialiser needs gateway state; none of it is used here.
+        self.id = channel_id
+        self.guild_id = guild_id
+        self.clock = clock
+        self.metrics = metrics
+        self.latency = latency
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, embeds=None, **kwargs):
+        self.clock.advance(self.latency)
+        embeds = [embed] if embed is not None else list(embeds or [])
+        message = SimulatedMessage(self.id * 10 ** 6 + len(self.messages) + 1, self, content, embeds)
+        self.messages[message.id] = message
+        self.metrics.counts['messages'] += 1
+        self.metrics.on_embeds(self.guild_id, content, embeds)
+        return message
+
+    async def fetch_message(self, message_id: int):
+        self.clock.advance(self.latency)
+        return self.messages.get(message_id)
+
+
+class SimulatedMember:
+    def __init__(self, clock: VirtualClock, metrics: SimulationMetrics):
+        self.clock = clock
+        self.metrics = metrics
+        self.display_name = "member"
+
+    async def edit(self, nick=None):
+        self.display_name = nick
+        self.metrics.counts['nickname_changes'] += 1
+        self.metrics.nickname_change_times.append(self.clock.now(timezone.utc).strftime('%H:%M'))
+
+
+class SimulatedGuild:
+    def __init__(self, guild_id: int, member):
+        self.id = guild_id
+        self.name = f"Simulated guild {guild_id}"
+        self._member = member
+
+    def get_member(self, user_id: int):
+        return self._member
+
+
+class SimulatedBot:
+    def __init__(self, channels: dict, guild):
+        self.user = None
+        self._channels = channels
+        self._guild = guild
+
+    def get_channel(self, channel_id: int):
+        return self._channels.get(channel_id)
+
+    def get_guild(self, guild_id: int):
+        return self._guild if guild_id == self._guild.id else None
+
+    async def wait_until_ready(self):
+        return None
+
+
+@contextlib.contextmanager
+def _patched(module, **attributes):
+    """Temporarily replaces module-level settings (credentials, IDs, the registrations writer)."""
+    originals = {name: getattr(module, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def _working_directory(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+async def run_simulation(days: float = 7, streamers: int = 200, guilds: int = 3, follows: int = 80,
+                         digest_seconds: int = 0, clips: bool = True, api_latency: float = 0.1,
+                         discord_latency: float = 0.1, error_rate: float = 0.0, seed: int = 0) -> dict:
+    """Simulates `days` of activity and returns the report. Runs in a temporary directory, so real bot state is untouched."""
+    start, end = SIMULATION_EPOCH, SIMULATION_EPOCH + days * 86400
+    clock = VirtualClock(start)
+    scheduler = VirtualScheduler(clock)
+    model = SyntheticStreamModel(streamers, start, end, seed=seed)
+    helix = SimulatedHelix(model, clock, latency=api_latency, error_rate=error_rate, seed=seed)
+    metrics = SimulationMetrics(model, clock)
+    state_writes = [0]
+
+    def count_state_write(data, filepath, description):
+        # The real writer would rewrite the whole file on every change; only the count matters here.
+        state_writes[0] += 1
+
+    rng = random.Random(seed)
+    channels = {}
+    for g in range(guilds):
+        for offset in (1, 2):
+            channels[(g + 1) * 100 + offset] = None
+    member = SimulatedMember(clock, metrics)
+    guild = SimulatedGuild(1, member)
+    bot = SimulatedBot(channels, guild)
+    for channel_id in channels:
+        channels[channel_id] = SimulatedChannel(channel_id, str(channel_id // 100), clock, metrics, discord_latency)
+
+    with tempfile.TemporaryDirectory() as workdir, _working_directory(workdir), \
+            _patched(twitch_cog, TWITCH_CLIENT_ID='simulated', TWITCH_CLIENT_SECRET='simulated',
+                     _save_json_data=count_state_write), \
+            _patched(name_changer_cog, SERVER_ID=guild.id, USER_ID=1):
+        cog = twitch_cog.TwitchNotificationsCog(bot, clock=clock)
+        cog._helix_request = helix.request
+        names = iter(f"Name{i}" for i in range(10 ** 6))
+        name_cog = name_changer_cog.NameChangerCog(bot, clock=clock)
+        name_cog.get_random_male_name = lambda: asyncio.sleep(0, next(names))
+
+        for g in range(guilds):
+            guild_id_str = str(g + 1)
+            cog.guild_settings[guild_id_str] = {'twitch_notification_channel_id': (g + 1) * 100 + 1,
+                                                'twitch_digest_seconds': digest_seconds}
+            if clips:
+                cog.guild_settings[guild_id_str]['twitch_clips_channel_id'] = (g + 1) * 100 + 2
+            cog.guild_stream_registrations[guild_id_str] = {
+                tid: {"display_name": model.display_name(tid), "login_name": model.logins[tid], "last_live_status": False,
+                      "last_stream_id": None, "last_game_name": None, "last_game_id": None, "stream_start_timestamp": None,
+                      "last_thumbnail_url": None, "peak_viewers": 0, "avg_viewers": 0, "total_viewers": 0,
+                      "viewer_count_samples": 0, "seen_clip_ids": [], "stream_clips": [], "last_clip_harvest_at": None,
+                      "registered_by": 1}
+                for tid in rng.sample(model.user_ids, min(follows, streamers))}
+
+        daily_state = []
+
+        async def poll_tick():
+            await cog.run_poll_tick()
+            await cog.delivery_queue.run_pending()
+
+        async def sample_state():
+            daily_state.append({
+                'day': len(daily_state) + 1,
+                'registrations_bytes': len(json.dumps(cog.guild_stream_registrations, indent=4)),
+                'live_snapshot_bytes': os.path.getsize(twitch_cog.LIVE_STATE_FILE) if os.path.exists(twitch_cog.LIVE_STATE_FILE) else 0,
+                'seen_clip_ids': sum(len(d.get('seen_clip_ids') or []) for streams in cog.guild_stream_registrations.values()
+                                     for d in streams.values()),
+                'open_digests': len(cog._go_live_digests),
+                'queue_depth': cog.delivery_queue.depth,
+            })
+
+        await cog.reconcile_live_state()
+        cog._reconciled = True
+        scheduler.every(cog.poll_wheel.slot_seconds, poll_tick, name='twitch_poll')
+        scheduler.every(twitch_cog.IDENTITY_REFRESH_MIN_INTERVAL_SECONDS, cog.run_identity_refresh, name='identity_refresh')
+        scheduler.daily(name_changer_cog.DAILY_CHANGE_TIME, name_cog.run_daily_change, name='nickname_change')
+        scheduler.every(86400, sample_state, name='state_sample', first_at=start + 86400)
+        await scheduler.run_until(end)
+
+    expected = {(guild_id_str, tid, session['id'])
+                for guild_id_str, streams in cog.guild_stream_registrations.items() for tid in streams
+                for session in model.sessions(tid) if session['start'] <= end - 2 * twitch_cog.POLL_INTERVAL_SECONDS}
+    return {
+        'simulated_days': days, 'streamers': streamers, 'guilds': guilds, 'follows_per_guild': min(follows, streamers),
+        'streams_started': sum(len(model.sessions(tid)) for tid in model.user_ids),
+        'go_live_latency_seconds': _percentiles(metrics.go_live_latencies),
+        'offline_latency_seconds': _percentiles(metrics.offline_latencies),
+        'missed_go_lives': len(expected - set(metrics.announced)),
+        'duplicate_go_lives': sum(n - 1 for n in metrics.announced.values()),
+        'discord': metrics.counts,
+        'nickname_change_times_utc': sorted(set(metrics.nickname_change_times)),
+        'api_calls': dict(sorted(helix.calls.items())), 'api_calls_total': sum(helix.calls.values()),
+        'api_errors_injected': helix.errors,
+        'api_calls_per_simulated_hour': round(sum(helix.calls.values()) / (days * 24), 1),
+        'registration_writes': state_writes[0],
+        'delivery_queue': cog.delivery_queue.stats(),
+        'poll_wheel': {'slot_overruns': cog.poll_wheel.overruns, 'slow_revolutions': cog.poll_wheel.slow_revolutions},
+        'scheduler_runs': scheduler.runs,
+        'state_per_day': daily_state,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate days of Twitch activity against the bot's cogs under virtual time.")
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--streamers', type=int, default=200, help="Broadcasters in the synthetic model.")
+    parser.add_argument('--guilds', type=int, default=3)
+    parser.add_argument('--follows', type=int, default=80, help="Broadcasters registered per guild.")
+    parser.add_argument('--digest-seconds', type=int, default=0, help="Go-live digest window for every guild.")
+    parser.add_argument('--no-clips', action='store_true', help="Don't configure clips channels.")
+    parser.add_argument('--api-latency', type=float, default=0.1, help="Virtual seconds per Twitch API request.")
+    parser.add_argument('--discord-latency', type=float, default=0.1, help="Virtual seconds per Discord send, fetch or edit.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of Twitch API requests that fail.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+
+    configure_logging(level=args.log_level)
+    report = asyncio.run(run_simulation(
+        days=args.days, streamers=args.streamers, guilds=args.guilds, follows=args.follows,
+        digest_seconds=args.digest_seconds, clips=not args.no_clips, api_latency=args.api_latency,
+        discord_latency=args.discord_latency, error_rate=args.error_rate, seed=args.seed))
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
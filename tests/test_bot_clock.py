@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime, time as dt_time, timezone
+
+from bot_clock import VirtualClock, VirtualScheduler
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+class TestVirtualScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_jobs_run_in_due_order_on_virtual_time(self):
+        clock = VirtualClock(START)
+        scheduler = VirtualScheduler(clock)
+        runs = []
+
+        async def fast():
+            runs.append(('fast', clock.time() - START))
+
+        async def slow():
+            runs.append(('slow', clock.time() - START))
+
+        scheduler.every(10, fast)
+        scheduler.every(25, slow, first_at=START + 25)
+        await scheduler.run_until(START + 50)
+
+        self.assertEqual(runs, [('fast', 0), ('fast', 10), ('fast', 20), ('slow', 25), ('fast', 30),
+                                ('fast', 40), ('slow', 50), ('fast', 50)])
+        self.assertEqual(clock.time(), START + 50)
+
+    async def test_job_can_change_its_interval(self):
+        clock = VirtualClock(START)
+        scheduler = VirtualScheduler(clock)
+        runs = []
+
+        async def backing_off():
+            runs.append(clock.time() - START)
+            return 2 * (len(runs) * 10)
+
+        scheduler.every(10, backing_off)
+        await scheduler.run_until(START + 100)
+        self.assertEqual(runs, [0, 20, 60])
+
+    async def test_daily_job_runs_at_wall_clock_time(self):
+        clock = VirtualClock(START + 12 * 3600) # Noon, after today's run time
+        scheduler = VirtualScheduler(clock)
+        runs = []
+
+        async def daily():
+            runs.append(clock.now(timezone.utc))
+
+        scheduler.daily(dt_time(hour=6, minute=1, tzinfo=timezone.utc), daily)
+        await scheduler.run_until(START + 3 * 86400)
+        self.assertEqual([(d.day, d.hour, d.minute) for d in runs], [(2, 6, 1), (3, 6, 1)])
+
+    async def test_time_spent_inside_a_job_delays_later_jobs(self):
+        clock = VirtualClock(START)
+        scheduler = VirtualScheduler(clock)
+        runs = []
+
+        async def slow_job():
+            runs.append(clock.time() - START)
+            clock.advance(15) # Overruns its 10s interval
+
+        scheduler.every(10, slow_job)
+        await scheduler.run_until(START + 30)
+        self.assertEqual(runs, [0, 15, 30])
+
+if __name__ == '__main__':
+    unittest.main()
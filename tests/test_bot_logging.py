@@ -0,0 +1,46 @@
+import json
+import logging
+import queue
+import unittest
+from unittest.mock import patch
+
+from bot_logging import RateLimitFilter, NonBlockingQueueHandler, JsonFormatter, get_logger
+
+def _record(msg, *args, level=logging.ERROR, name="decayeddojo.twitch"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+class TestBotLogging(unittest.TestCase):
+
+    def test_get_logger_is_per_component(self):
+        self.assertEqual(get_logger("twitch").name, "decayeddojo.twitch")
+
+    def test_rate_limit_filter_suppresses_repeats_of_same_template(self):
+        rate_filter = RateLimitFilter(burst=3, window_seconds=60)
+        with patch('time.monotonic', return_value=0):
+            passed = [rate_filter.filter(_record("Error checking %s: %s", f"user{i}", "HTTP 500")) for i in range(1000)]
+            self.assertTrue(rate_filter.filter(_record("Error fetching clips: %s", "timeout"))) # Different template
+        self.assertEqual(sum(passed), 3)
+
+        with patch('time.monotonic', return_value=61):
+            record = _record("Error checking %s: %s", "user0", "HTTP 500")
+            self.assertTrue(rate_filter.filter(record))
+        self.assertEqual(record.suppressed, 997)
+
+    def test_queue_handler_drops_instead_of_blocking_when_full(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+        for i in range(5):
+            handler.emit(_record("message %s", i))
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_json_formatter(self):
+        record = _record("Stream went offline: %s", "streamer", level=logging.INFO)
+        record.suppressed = 4
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "Stream went offline: streamer")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "decayeddojo.twitch")
+        self.assertEqual(entry["suppressed"], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import discord
+
+from cogs.twitch_notifications.delivery import NotificationDelivery, WEBHOOK_NAME
+
+def _forbidden():
+    response = MagicMock()
+    response.status = 403
+    return discord.Forbidden(response, "Missing Permissions")
+
+class TestNotificationDelivery(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.mock_bot = MagicMock()
+        self.get_session = AsyncMock(return_value=MagicMock())
+        self.channel = MagicMock()
+        self.channel.id = 10
+        self.channel.send = AsyncMock(return_value="bot message")
+        self.channel.fetch_message = AsyncMock(return_value="bot fetched")
+
+    async def test_webhooks_disabled_sends_as_bot(self):
+        delivery = NotificationDelivery(self.mock_bot, use_webhooks=False, get_session=self.get_session)
+        message = await delivery.send(self.channel, content="hi")
+        self.assertEqual(message, "bot message")
+        self.channel.send.assert_awaited_once_with(content="hi")
+        self.channel.webhooks.assert_not_called()
+
+    async def test_missing_permission_falls_back_to_bot_and_is_cached(self):
+        self.channel.webhooks = AsyncMock(side_effect=_forbidden())
+        delivery = NotificationDelivery(self.mock_bot, use_webhooks=True, get_session=self.get_session)
+
+        await delivery.send(self.channel, content="one")
+        await delivery.send(self.channel, content="two")
+
+        self.assertEqual(self.channel.send.await_count, 2)
+        self.channel.webhooks.assert_awaited_once() # The fallback decision is cached per channel
+
+    @patch('discord.Webhook.from_url')
+    async def test_creates_webhook_and_sends_through_it(self, mock_from_url):
+        self.channel.webhooks = AsyncMock(return_value=[])
+        self.channel.create_webhook = AsyncMock(return_value=MagicMock(url="https://discord.com/api/webhooks/1/token"))
+        webhook = MagicMock()
+        webhook.send = AsyncMock(return_value="webhook message")
+        webhook.fetch_message = AsyncMock(side_effect=discord.NotFound(MagicMock(status=404), "Unknown Message"))
+        mock_from_url.return_value = webhook
+        delivery = NotificationDelivery(self.mock_bot, use_webhooks=True, get_session=self.get_session)
+
+        message = await delivery.send(self.channel, content="hi")
+        fetched = await delivery.fetch_message(self.channel, 123) # Sent by the bot before webhooks were enabled
+
+        self.assertEqual(message, "webhook message")
+        self.channel.create_webhook.assert_awaited_once()
+        self.assertEqual(self.channel.create_webhook.call_args.kwargs['name'], WEBHOOK_NAME)
+        self.assertTrue(webhook.send.call_args.kwargs['wait'])
+        self.assertEqual(fetched, "bot fetched")
+        self.channel.send.assert_not_called()
+
+    @patch('discord.Webhook.from_url')
+    async def test_fetch_message_goes_straight_to_the_sending_backend(self, mock_from_url):
+        self.channel.webhooks = AsyncMock(return_value=[MagicMock(url="https://discord.com/api/webhooks/1/token", token="token")])
+        self.channel.webhooks.return_value[0].name = WEBHOOK_NAME
+        webhook = MagicMock()
+        webhook.fetch_message = AsyncMock(return_value="webhook fetched")
+        mock_from_url.return_value = webhook
+        delivery = NotificationDelivery(self.mock_bot, use_webhooks=True, get_session=self.get_session)
+
+        self.assertEqual(await delivery.fetch_message(self.channel, 1, via_webhook=False), "bot fetched")
+        webhook.fetch_message.assert_not_called()
+        self.assertEqual(await delivery.fetch_message(self.channel, 2, via_webhook=True), "webhook fetched")
+        self.channel.fetch_message.assert_awaited_once_with(1)
+
+if __name__ == '__main__':
+    unittest.main()
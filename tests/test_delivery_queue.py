@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+
+from bot_clock import VirtualClock
+from cogs.twitch_notifications.delivery_queue import (
+    DeliveryQueue, PRIORITY_GO_LIVE, PRIORITY_OFFLINE_SUMMARY, PRIORITY_CLIP_DIGEST, PRIORITY_VIEWER_EDIT)
+
+class TestDeliveryQueue(unittest.IsolatedAsyncioTestCase):
+
+    def _job(self, delivered, name):
+        async def job():
+            delivered.append(name)
+        return job
+
+    async def test_jobs_run_in_priority_then_submission_order(self):
+        queue = DeliveryQueue()
+        delivered = []
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit"))
+        queue.submit(PRIORITY_CLIP_DIGEST, self._job(delivered, "clips"))
+        queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "live-1"))
+        queue.submit(PRIORITY_OFFLINE_SUMMARY, self._job(delivered, "offline"))
+        queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "live-2"))
+
+        await queue.run_pending()
+
+        self.assertEqual(delivered, ["live-1", "live-2", "offline", "clips", "edit"])
+        self.assertEqual(queue.stats()['processed'], 5)
+        self.assertEqual(queue.depth, 0)
+
+    async def test_newer_edit_supersedes_pending_one(self):
+        queue = DeliveryQueue()
+        delivered = []
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "old"), coalesce_key=("edit", 1))
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "new"), coalesce_key=("edit", 1))
+        self.assertEqual(queue.depth, 1)
+
+        await queue.run_pending()
+
+        self.assertEqual(delivered, ["new"])
+        self.assertEqual(queue.superseded, 1)
+
+    async def test_full_queue_sheds_edits_but_never_go_live(self):
+        queue = DeliveryQueue(pressure_depth=100, max_depth=2)
+        delivered = []
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit-1"))
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit-2"))
+        self.assertTrue(queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "live"))) # Sheds edit-1
+        self.assertTrue(queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "live-2"))) # Sheds edit-2
+        self.assertTrue(queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "live-3"))) # Nothing left to shed, accepted anyway
+        self.assertFalse(queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit-3")))
+
+        await queue.run_pending()
+
+        self.assertEqual(delivered, ["live", "live-2", "live-3"])
+        self.assertEqual(queue.dropped, 3)
+
+    async def test_stale_edits_dropped_under_pressure(self):
+        clock = VirtualClock(100)
+        queue = DeliveryQueue(pressure_depth=2, stale_after_seconds=5, clock=clock.monotonic)
+        delivered = []
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit-a"))
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit-b"))
+        queue.submit(PRIORITY_CLIP_DIGEST, self._job(delivered, "clips"))
+        clock.advance(100)
+        await queue.run_pending()
+
+        # Clips are never shed; the first stale edit is dropped while the queue is still under pressure.
+        self.assertEqual(delivered, ["clips", "edit-b"])
+        self.assertEqual(queue.dropped, 1)
+
+    async def test_failing_job_is_counted_and_does_not_stop_worker(self):
+        queue = DeliveryQueue()
+        delivered = []
+        async def failing():
+            raise RuntimeError("429 Too Many Requests")
+        queue.submit(PRIORITY_GO_LIVE, failing)
+        queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "after"))
+
+        await queue.run_pending()
+
+        self.assertEqual(delivered, ["after"])
+        self.assertEqual(queue.failed, 1)
+
+    async def test_drain_delivers_everything_queued(self):
+        queue = DeliveryQueue()
+        delivered = []
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit"))
+        queue.submit(PRIORITY_GO_LIVE, self._job(delivered, "go-live"))
+
+        self.assertTrue(await queue.drain(timeout=1))
+        self.assertEqual(delivered, ["go-live", "edit"])
+
+    async def test_drain_lets_current_job_finish_and_leaves_the_rest(self):
+        queue = DeliveryQueue()
+        delivered = []
+
+        async def slow_job():
+            await asyncio.sleep(0.35)
+            delivered.append("slow")
+
+        queue.submit(PRIORITY_GO_LIVE, slow_job)
+        queue.submit(PRIORITY_VIEWER_EDIT, self._job(delivered, "edit"))
+
+        # New jobs stop at 0.25s (grace is capped at half the timeout); the slow job started before that and
+        # finishes within the 0.5s deadline.
+        self.assertFalse(await queue.drain(timeout=0.5, job_grace_seconds=0.4))
+        self.assertEqual(delivered, ["slow"])
+        self.assertEqual(queue.depth, 1)
+
+    async def test_drain_never_runs_past_its_timeout(self):
+        queue = DeliveryQueue()
+
+        async def stuck_job():
+            await asyncio.sleep(10)
+
+        queue.submit(PRIORITY_GO_LIVE, stuck_job)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with self.assertLogs('decayeddojo.twitch.delivery_queue', level='WARNING'):
+            await queue.drain(timeout=0.2, job_grace_seconds=5)
+        self.assertLess(loop.time() - started, 0.3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from cogs.twitch_notifications.helix_trace import (
+    HelixTraceRecorder, HelixReplay, load_trace, summarize_trace, REPLAY_TOKEN)
+
+class TestHelixTrace(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trace_path = os.path.join(self.tmpdir.name, "trace.jsonl.gz")
+
+    async def asyncTearDown(self):
+        self.tmpdir.cleanup()
+
+    def _record_sample_trace(self):
+        recorder = HelixTraceRecorder(self.trace_path)
+        recorder.record('POST', 'https://id.twitch.tv/oauth2/token',
+                        {'client_id': 'id', 'client_secret': 'secret', 'grant_type': 'client_credentials'},
+                        200, {'access_token': 'real-token', 'expires_in': 3600}, 1000.0, 0.05)
+        streams_query = [('user_id', '1'), ('first', '100')]
+        recorder.record('GET', 'https://api.twitch.tv/helix/streams', streams_query, 200, {'data': []}, 1001.0, 0.1)
+        recorder.record('GET', 'https://api.twitch.tv/helix/streams', streams_query, 200,
+                        {'data': [{'id': 's1', 'user_id': '1', 'viewer_count': 7}]}, 1061.0, 0.2)
+        recorder.close()
+
+    def test_recorder_redacts_credentials(self):
+        self._record_sample_trace()
+        entries = load_trace(self.trace_path)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0]['query'], [['grant_type', 'client_credentials']])
+        self.assertEqual(entries[0]['body']['access_token'], REPLAY_TOKEN)
+        self.assertEqual(entries[1]['path'], '/helix/streams')
+
+    def test_replay_lookup_follows_trace_time(self):
+        self._record_sample_trace()
+        replay = HelixReplay(load_trace(self.trace_path))
+        query = [['first', '100'], ['user_id', '1']]
+        self.assertEqual(replay.lookup('GET', '/helix/streams', query, trace_offset=10)['body'], {'data': []})
+        self.assertEqual(len(replay.lookup('GET', '/helix/streams', query, trace_offset=70)['body']['data']), 1)
+        self.assertIsNone(replay.lookup('GET', '/helix/games', [], trace_offset=70))
+
+    def test_replay_matches_clip_requests_whatever_their_started_at(self):
+        recorder = HelixTraceRecorder(self.trace_path)
+        for ts, started_at, clip_id in ((1000.0, '2024-01-01T00:00:00Z', 'a'), (1300.0, '2024-01-01T00:05:00Z', 'b')):
+            recorder.record('GET', 'https://api.twitch.tv/helix/clips', {'broadcaster_id': '1', 'started_at': started_at},
+                            200, {'data': [{'id': clip_id}]}, ts, 0.1)
+        recorder.close()
+        replay = HelixReplay(load_trace(self.trace_path))
+
+        # Replay runs at a different wall-clock time, so started_at never matches the recording exactly.
+        query = [['broadcaster_id', '1'], ['started_at', '2025-06-01T12:34:56Z']]
+        self.assertEqual(replay.lookup('GET', '/helix/clips', query, trace_offset=10)['body']['data'][0]['id'], 'a')
+        self.assertEqual(replay.lookup('GET', '/helix/clips', query, trace_offset=400)['body']['data'][0]['id'], 'b')
+
+    def test_summarize_trace(self):
+        self._record_sample_trace()
+        summary = summarize_trace(load_trace(self.trace_path))
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['endpoints']['/helix/streams']['requests'], 2)
+        self.assertEqual(summary['endpoints']['/helix/streams']['max_latency'], 0.2)
+
+    async def test_cog_runs_against_replay_server(self):
+        self._record_sample_trace()
+        replay = HelixReplay(load_trace(self.trace_path), speed=1000, clock=lambda: 0)
+        server = TestServer(replay.make_app())
+        await server.start_server()
+        base = str(server.make_url('')).rstrip('/')
+        module = 'cogs.twitch_notifications.twitch_notifications_cog'
+        with patch(f'{module}.TWITCH_CLIENT_ID', 'id'), patch(f'{module}.TWITCH_CLIENT_SECRET', 'secret'), \
+             patch(f'{module}.TWITCH_API_BASE_URL', f'{base}/helix'), patch(f'{module}.TWITCH_AUTH_BASE_URL', f'{base}/oauth2'), \
+             patch(f'{module}._load_json_data', return_value={}):
+            from cogs.twitch_notifications.twitch_notifications_cog import TwitchNotificationsCog
+            cog = TwitchNotificationsCog(unittest.mock.MagicMock())
+            try:
+                token = await cog.get_twitch_app_access_token()
+                streams = await cog.get_streams_by_user_ids(['1'], {'Authorization': f'Bearer {token}'})
+            finally:
+                await cog._http_session.close()
+                await server.close()
+
+        self.assertEqual(token, REPLAY_TOKEN)
+        self.assertEqual(streams, {}) # Replay clock is at the start of the trace
+        self.assertEqual(replay.served, 2)
+        self.assertEqual(replay.misses, 0)
+
+    async def test_speed_scales_latency_but_not_trace_time(self):
+        self._record_sample_trace()
+        ticks = iter([0, 10])
+        replay = HelixReplay(load_trace(self.trace_path), speed=10, clock=lambda: next(ticks))
+        server = TestServer(replay.make_app())
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                for _ in range(2):
+                    async with session.get(server.make_url('/helix/streams'), params=[('user_id', '1'), ('first', '100')]) as response:
+                        body = await response.json()
+        finally:
+            await server.close()
+        # 10 real seconds in is 10 seconds into the trace, before the stream recorded at 61s went live.
+        self.assertEqual(body, {'data': []})
+
+    async def test_failed_requests_are_recorded_and_replayed(self):
+        recorder = HelixTraceRecorder(self.trace_path)
+        recorder.record('POST', 'https://id.twitch.tv/oauth2/token', {'grant_type': 'client_credentials'}, 503, None, 1000.0, 0.05)
+        recorder.record('GET', 'https://api.twitch.tv/helix/streams', [('user_id', '1'), ('first', '100')], None, None,
+                        1001.0, 0.1, error='ServerTimeoutError')
+        recorder.close()
+        replay = HelixReplay(load_trace(self.trace_path), speed=1000, clock=lambda: 0)
+        server = TestServer(replay.make_app())
+        await server.start_server()
+        base = str(server.make_url('')).rstrip('/')
+        rerecorded_path = os.path.join(self.tmpdir.name, "replayed.jsonl")
+        module = 'cogs.twitch_notifications.twitch_notifications_cog'
+        with patch(f'{module}.TWITCH_CLIENT_ID', 'id'), patch(f'{module}.TWITCH_CLIENT_SECRET', 'secret'), \
+             patch(f'{module}.TWITCH_API_BASE_URL', f'{base}/helix'), patch(f'{module}.TWITCH_AUTH_BASE_URL', f'{base}/oauth2'), \
+             patch(f'{module}._load_json_data', return_value={}):
+            from cogs.twitch_notifications.twitch_notifications_cog import TwitchNotificationsCog
+            cog = TwitchNotificationsCog(unittest.mock.MagicMock())
+            cog.helix_recorder = HelixTraceRecorder(rerecorded_path)
+            try:
+                with self.assertLogs('decayeddojo.twitch', level='ERROR'):
+                    token = await cog.get_twitch_app_access_token()
+                    streams = await cog.get_streams_by_user_ids(['1'], {})
+            finally:
+                cog.helix_recorder.close()
+                await cog._http_session.close()
+                await server.close()
+
+        self.assertIsNone(token)
+        self.assertIsNone(streams) # The recorded failure is reproduced, not served as "nobody is live"
+        rerecorded = load_trace(rerecorded_path)
+        self.assertEqual([entry['status'] for entry in rerecorded], [503, None])
+        self.assertEqual(rerecorded[0]['error'], 'ClientResponseError')
+        self.assertIn('error', rerecorded[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from cogs.twitch_notifications.login_index import LoginIndex
+
+class TestLoginIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = LoginIndex({
+            "1": {"login_name": "alpha"}, "2": {"login_name": "Alphabet"}, "3": {"login_name": "beta"},
+        })
+
+    def test_complete_returns_prefix_matches_in_order(self):
+        self.assertEqual(self.index.complete("AL"), [("alpha", "1"), ("alphabet", "2")])
+        self.assertEqual(self.index.complete("alphab"), [("alphabet", "2")])
+        self.assertEqual(self.index.complete("z"), [])
+        self.assertEqual(len(self.index.complete("")), 3)
+        self.assertEqual(self.index.complete("", limit=1), [("alpha", "1")])
+
+    def test_incremental_updates(self):
+        self.index.add("Gamma", "4")
+        self.index.add("gamma", "4") # Adding twice is a no-op
+        self.assertEqual(self.index.find("GAMMA"), "4")
+        self.assertEqual(len(self.index), 4)
+
+        self.index.remove("alpha", "1")
+        self.assertIsNone(self.index.find("alpha"))
+        self.assertEqual(self.index.complete("al"), [("alphabet", "2")])
+
+        self.index.rename("beta", "delta", "3")
+        self.assertIsNone(self.index.find("beta"))
+        self.assertEqual(self.index.find("delta"), "3")
+
+    def test_complete_is_bounded_for_large_guilds(self):
+        index = LoginIndex({str(i): {"login_name": f"streamer{i:05d}"} for i in range(20000)})
+        matches = index.complete("streamer1", limit=25)
+        self.assertEqual(len(matches), 25)
+        self.assertEqual(matches[0], ("streamer10000", "10000"))
+
+if __name__ == '__main__':
+    unittest.main()
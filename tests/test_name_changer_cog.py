@@ -73,6 +73,17 @@ class TestNameChangerCog(unittest.IsolatedAsyncioTestCase): # Changed TestCase t
         self.assertEqual(message, "TestName")
         mock_member.edit.assert_called_once_with(nick="TestName")
 
+    async def test_perform_nickname_change_guild_not_found_logs_template(self):
+        self.cog.bot.get_guild = MagicMock(return_value=None)
+
+        with self.assertLogs('decayeddojo.name_changer', level='ERROR') as logs:
+            success, message = await self.cog.perform_nickname_change(guild_id=123, target_user_id=456)
+
+        self.assertFalse(success)
+        self.assertEqual(message, "Error: Server with ID 123 not found. Check DISCORD_SERVER_ID.")
+        # Logged as a template with arguments, so the rate limiter groups repeats of the same failure.
+        self.assertEqual(logs.records[0].msg, "Error: Server with ID %s not found. Check DISCORD_SERVER_ID.")
+
     # More tests can be added for failure cases of perform_nickname_change
     # (e.g. guild not found, member not found, API fail for name, permission error)
 
@@ -0,0 +1,53 @@
+import gc
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from runtime_profile import PERFORMANCE_GC_THRESHOLDS, StartupTimer, apply_runtime_profile, freeze_startup_heap, log
+
+class TestRuntimeProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.thresholds = gc.get_threshold()
+
+    def tearDown(self):
+        gc.set_threshold(*self.thresholds)
+        gc.unfreeze()
+
+    def test_default_profile_changes_nothing(self):
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertEqual(apply_runtime_profile(), 'default')
+        self.assertEqual(gc.get_threshold(), self.thresholds)
+
+    def test_unknown_profile_falls_back_to_default(self):
+        with self.assertLogs('decayeddojo.runtime', level='WARNING'):
+            self.assertEqual(apply_runtime_profile('turbo'), 'default')
+
+    def test_performance_profile_without_uvloop_keeps_asyncio(self):
+        with patch.dict(sys.modules, {'uvloop': None}), patch('asyncio.set_event_loop_policy') as mock_set_policy:
+            self.assertEqual(apply_runtime_profile('performance'), 'performance')
+        mock_set_policy.assert_not_called()
+        self.assertEqual(gc.get_threshold(), PERFORMANCE_GC_THRESHOLDS)
+
+    def test_performance_profile_installs_uvloop_when_available(self):
+        fake_uvloop = MagicMock()
+        with patch.dict(sys.modules, {'uvloop': fake_uvloop}), patch('asyncio.set_event_loop_policy') as mock_set_policy:
+            apply_runtime_profile('PERFORMANCE')
+        mock_set_policy.assert_called_once_with(fake_uvloop.EventLoopPolicy.return_value)
+
+    def test_freeze_startup_heap(self):
+        self.assertGreater(freeze_startup_heap(), 0)
+
+    def test_startup_timer_log_report(self):
+        ticks = iter([10.0, 10.5, 12.0])
+        timer = StartupTimer(started=9.0, clock=lambda: next(ticks))
+        timer.mark("imports")
+        timer.mark("load twitch_notifications_cog")
+        timer.mark("connect to Discord")
+        with self.assertLogs('decayeddojo.runtime', level='INFO') as logs:
+            timer.log_report(log)
+        self.assertEqual(logs.records[0].getMessage(),
+                         "Startup took 3.00s (imports 1.00s, load twitch_notifications_cog 0.50s, connect to Discord 1.50s).")
+
+if __name__ == '__main__':
+    unittest.main()
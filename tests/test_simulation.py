@@ -0,0 +1,32 @@
+import unittest
+
+from cogs.twitch_notifications.twitch_notifications_cog import POLL_SLOT_SECONDS
+from simulation import SIMULATION_EPOCH, SyntheticStreamModel, run_simulation
+
+class TestSimulation(unittest.IsolatedAsyncioTestCase):
+
+    def test_stream_model_is_deterministic(self):
+        a = SyntheticStreamModel(10, SIMULATION_EPOCH, SIMULATION_EPOCH + 86400, seed=3)
+        b = SyntheticStreamModel(10, SIMULATION_EPOCH, SIMULATION_EPOCH + 86400, seed=3)
+        self.assertEqual([a.sessions(tid) for tid in a.user_ids], [b.sessions(tid) for tid in b.user_ids])
+
+        tid = next(tid for tid in a.user_ids if a.sessions(tid))
+        session = a.sessions(tid)[0]
+        self.assertIsNone(a.stream_data(tid, session['start'] - 1))
+        self.assertEqual(a.stream_data(tid, session['start'] + 60)['id'], session['id'])
+        self.assertIsNone(a.stream_data(tid, session['end']))
+
+    async def test_simulated_day_announces_every_stream_once(self):
+        report = await run_simulation(days=1, streamers=30, guilds=2, follows=15, seed=1)
+
+        self.assertGreater(report['go_live_latency_seconds']['count'], 0)
+        self.assertEqual(report['missed_go_lives'], 0)
+        self.assertEqual(report['duplicate_go_lives'], 0)
+        # Every broadcaster is polled once per minute, so no announcement can be later than that plus delivery time.
+        self.assertLess(report['go_live_latency_seconds']['max'], 65)
+        self.assertEqual(report['nickname_change_times_utc'], ['06:01'])
+        self.assertEqual(report['scheduler_runs']['twitch_poll'], 86400 // POLL_SLOT_SECONDS)
+        self.assertEqual(len(report['state_per_day']), 1)
+
+if __name__ == '__main__':
+    unittest.main()
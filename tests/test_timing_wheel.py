@@ -0,0 +1,59 @@
+import unittest
+
+from cogs.twitch_notifications.timing_wheel import TimingWheel
+
+class TestTimingWheel(unittest.TestCase):
+
+    def test_keys_spread_evenly_and_each_polled_once_per_revolution(self):
+        wheel = TimingWheel(interval_seconds=60, slot_seconds=5)
+        keys = [str(i) for i in range(100)]
+
+        seen = []
+        slot_sizes = []
+        for _ in range(wheel.num_slots):
+            slot_keys = wheel.keys_for_slot(wheel.advance(now=0), keys)
+            slot_sizes.append(len(slot_keys))
+            seen.extend(slot_keys)
+
+        self.assertEqual(wheel.num_slots, 12)
+        self.assertEqual(sorted(seen), sorted(keys))
+        self.assertLessEqual(max(slot_sizes) - min(slot_sizes), 1)
+
+    def test_slot_assignment_is_stable(self):
+        keys = ["111", "222", "333"]
+        first = TimingWheel(60, 5)
+        second = TimingWheel(60, 5)
+        for key in keys:
+            self.assertEqual(first.slot_for(key, keys), second.slot_for(key, keys))
+
+    def test_adding_or_removing_a_key_never_moves_the_others(self):
+        wheel = TimingWheel(60, 5)
+        keys = [str(i) for i in range(120)]
+        before = {key: wheel.slot_for(key, keys) for key in keys}
+
+        grown = keys + ["new"]
+        self.assertEqual({key: wheel.slot_for(key, grown) for key in keys}, before)
+        shrunk = keys[1:]
+        self.assertEqual({key: wheel.slot_for(key, shrunk) for key in shrunk}, {key: before[key] for key in shrunk})
+
+        # New keys fill the slots that removals left short, keeping the spread even.
+        refilled = shrunk + ["a", "b"]
+        sizes = [len(wheel.keys_for_slot(slot, refilled)) for slot in range(wheel.num_slots)]
+        self.assertLessEqual(max(sizes) - min(sizes), 1)
+
+    def test_overruns_and_slow_revolutions_are_reported(self):
+        wheel = TimingWheel(interval_seconds=10, slot_seconds=5)
+        with self.assertLogs('decayeddojo.twitch.timing_wheel', level='WARNING') as logs:
+            self.assertFalse(wheel.record_slot_duration(0, 4.0))
+            self.assertTrue(wheel.record_slot_duration(0, 7.5))
+
+            wheel.advance(now=0)
+            wheel.advance(now=5)
+            wheel.advance(now=30) # Back at slot 0 after 30s of a 10s interval
+
+        self.assertEqual(wheel.overruns, 1)
+        self.assertEqual(wheel.slow_revolutions, 1)
+        self.assertEqual(len(logs.records), 2)
+
+if __name__ == '__main__':
+    unittest.main()
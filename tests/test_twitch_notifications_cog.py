@@ -2,9 +2,14 @@ import unittest
 from unittest.mock import patch, MagicMock, AsyncMock
 import time # For testing token expiry
 import os
+import functools
+import discord
 
+from bot_clock import VirtualClock
+from cogs.twitch_notifications.delivery_queue import PRIORITY_CLIP_DIGEST
 # For `python -m unittest discover`, direct imports from the project root should work
-from cogs.twitch_notifications.twitch_notifications_cog import TwitchNotificationsCog
+from cogs.twitch_notifications.twitch_notifications_cog import (
+    TwitchNotificationsCog, _apply_live_state_snapshot, IDENTITY_REFRESH_RETRY_SECONDS, IDENTITY_REFRESH_CYCLE_SECONDS)
 
 # Using IsolatedAsyncioTestCase for async tests
 class TestTwitchNotificationsCog(unittest.IsolatedAsyncioTestCase):
@@ -25,6 +30,8 @@ class TestTwitchNotificationsCog(unittest.IsolatedAsyncioTestCase):
         self.cog = TwitchNotificationsCog(self.mock_bot)
 
     async def asyncTearDown(self):
+        if self.cog._http_session:
+            await self.cog._http_session.close()
         self.client_id_patcher.stop()
         self.client_secret_patcher.stop()
         self.load_json_patcher.stop()
@@ -105,6 +112,452 @@ class TestTwitchNotificationsCog(unittest.IsolatedAsyncioTestCase):
         user_info = await self.cog.get_twitch_user_info("testuser")
         self.assertIsNone(user_info)
 
+    @patch('aiohttp.ClientSession.get')
+    async def test_get_twitch_users_by_ids_single_batched_request(self, mock_aio_get):
+        mock_api_response = AsyncMock()
+        mock_api_response.status = 200
+        mock_api_response.json.return_value = {
+            "data": [{"id": "1", "login": "one", "display_name": "One"},
+                     {"id": "2", "login": "two", "display_name": "Two"}]
+        }
+        mock_session_get_context_manager = AsyncMock()
+        mock_session_get_context_manager.__aenter__.return_value = mock_api_response
+        mock_aio_get.return_value = mock_session_get_context_manager
+
+        users = await self.cog.get_twitch_users_by_ids(["1", "2", "3"], {})
+        self.assertEqual(set(users), {"1", "2"})
+        mock_aio_get.assert_called_once()
+        self.assertEqual(mock_aio_get.call_args.kwargs['params'], [('id', '1'), ('id', '2'), ('id', '3')])
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_users_by_ids', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_app_access_token', new_callable=AsyncMock)
+    async def test_refresh_identity_batch_updates_renamed_broadcaster(self, mock_get_token, mock_get_users, mock_save):
+        mock_get_token.return_value = "fake_access_token"
+        mock_get_users.return_value = {"42": {"id": "42", "login": "newname", "display_name": "NewName"}}
+        self.cog.guild_stream_registrations = {
+            "100": {"42": {"login_name": "oldname", "display_name": "OldName"}},
+            "200": {"42": {"login_name": "oldname", "display_name": "OldName"}},
+        }
+
+        num_batches = await self.cog.refresh_identity_batch()
+
+        self.assertEqual(num_batches, 1)
+        for guild_id in ("100", "200"):
+            self.assertEqual(self.cog.guild_stream_registrations[guild_id]["42"]["login_name"], "newname")
+            self.assertEqual(self.cog.guild_stream_registrations[guild_id]["42"]["display_name"], "NewName")
+        mock_save.assert_called_once()
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_users_by_ids', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_app_access_token', new_callable=AsyncMock)
+    async def test_refresh_identity_batch_is_picked_from_the_clock(self, mock_get_token, mock_get_users):
+        mock_get_token.return_value = "fake_access_token"
+        mock_get_users.return_value = {} # Accounts deleted on Twitch don't hold up the next batch
+        self.cog.guild_stream_registrations = {"100": {str(i): {"login_name": f"user{i}"} for i in range(1000, 1101)}}
+        interval = IDENTITY_REFRESH_CYCLE_SECONDS / 2
+        self.cog.clock = VirtualClock(10 * interval) # Window 10 -> batch 0
+
+        self.assertEqual(await self.cog.refresh_identity_batch(), 2)
+        self.assertEqual(len(mock_get_users.call_args.args[0]), 100)
+
+        # A restarted cog in the next window carries on with batch 1 rather than starting over at batch 0.
+        restarted = TwitchNotificationsCog(self.mock_bot, clock=VirtualClock(11 * interval))
+        restarted.guild_stream_registrations = self.cog.guild_stream_registrations
+        self.assertEqual(await restarted.refresh_identity_batch(), 2)
+        self.assertEqual(mock_get_users.call_args.args[0], ["1100"])
+
+        mock_get_users.return_value = None # Request failed: retry soon
+        self.assertEqual(await restarted.run_identity_refresh(), IDENTITY_REFRESH_RETRY_SECONDS)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_game_info', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_user_profile', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_stream_clips', new_callable=AsyncMock)
+    async def test_clips_are_harvested_once_per_broadcaster(self, mock_get_clips, mock_profile, mock_game, mock_save):
+        mock_profile.return_value = None
+        mock_game.return_value = None
+        mock_get_clips.return_value = ([{"id": "c1", "title": "Clip", "view_count": 3}], None)
+        clips_channel = MagicMock(spec=discord.TextChannel)
+        self.mock_bot.get_channel.return_value = clips_channel
+        self.cog.clock = VirtualClock(1_000_000)
+        self.cog.guild_settings = {gid: {"twitch_clips_channel_id": 9} for gid in ("100", "200", "300")}
+        self.cog.guild_stream_registrations = {gid: {"42": {"login_name": "streamer", "last_live_status": False}}
+                                               for gid in ("100", "200", "300")}
+        stream = {"id": "s1", "viewer_count": 5, "started_at": "2024-01-01T00:00:00Z"}
+
+        for _ in range(2): # Two passes inside one harvest interval
+            for gid, streams in self.cog.guild_stream_registrations.items():
+                await self.cog.process_stream_status(gid, MagicMock(), "42", streams["42"], stream, {})
+            self.cog.clock.advance(60)
+        self.assertEqual(mock_get_clips.await_count, 1)
+
+        queued = []
+        self.cog._queue_summary = lambda priority, channel, embeds, sent_log, login_name: queued.append(priority)
+        for gid, streams in self.cog.guild_stream_registrations.items():
+            await self.cog.process_stream_status(gid, MagicMock(), "42", streams["42"], None, {})
+        self.assertEqual(mock_get_clips.await_count, 2) # One final pass shared by all three summaries
+        self.assertEqual(queued.count(PRIORITY_CLIP_DIGEST), 3)
+
+    async def test_poll_loop_ticks_at_the_wheel_slot_width(self):
+        for configured, expected in ((40, 30), (7, 60 / 9), (5, 5)):
+            with patch('cogs.twitch_notifications.twitch_notifications_cog.POLL_SLOT_SECONDS', configured):
+                cog = TwitchNotificationsCog(self.mock_bot)
+            self.assertAlmostEqual(cog.check_twitch_streams_task.seconds, expected)
+            self.assertAlmostEqual(cog.poll_wheel.slot_seconds * cog.poll_wheel.num_slots, 60)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_stream_clips', new_callable=AsyncMock)
+    async def test_harvest_stream_clips_follows_cursor_and_dedupes(self, mock_get_clips):
+        details = {"stream_start_timestamp": time.time() - 3600, "seen_clip_ids": ["a"], "stream_clips": [
+            {"id": "a", "title": "Old", "creator_name": "x", "view_count": 5, "url": "u/a"}]}
+        mock_get_clips.side_effect = [
+            ([{"id": "a", "view_count": 9}, {"id": "b", "title": "B", "view_count": 7}], "cursor-1"),
+            ([{"id": "c", "title": "C", "view_count": 1}, {"id": "b", "view_count": 7}], None),
+        ]
+
+        new_clips = await self.cog.harvest_stream_clips("42", details, {})
+
+        self.assertEqual(new_clips, 2)
+        self.assertEqual(mock_get_clips.call_count, 2)
+        self.assertEqual(mock_get_clips.call_args_list[1].kwargs['after'], "cursor-1")
+        self.assertEqual(details["seen_clip_ids"], ["a", "b", "c"])
+        self.assertEqual([clip["id"] for clip in details["stream_clips"]], ["b", "a", "c"])
+        self.assertIsNotNone(details["last_clip_harvest_at"])
+
+    def test_apply_live_state_snapshot_only_when_newer(self):
+        registrations = {"100": {"1": {"last_live_status": False}, "2": {"last_live_status": True}}}
+        snapshot = {"saved_at": 2000, "live": {"100": {"1": {"last_live_status": True, "last_stream_id": "s1",
+                                                               "last_message_id": 55, "stream_start_timestamp": 1000}}}}
+
+        self.assertIsNone(_apply_live_state_snapshot(registrations, snapshot, registrations_saved_at=3000))
+        self.assertFalse(registrations["100"]["1"]["last_live_status"])
+
+        self.assertEqual(_apply_live_state_snapshot(registrations, snapshot, registrations_saved_at=1500), 2000)
+        self.assertTrue(registrations["100"]["1"]["last_live_status"])
+        self.assertEqual(registrations["100"]["1"]["last_message_id"], 55)
+        self.assertFalse(registrations["100"]["2"]["last_live_status"])
+
+    def test_last_known_live_time_falls_back_to_registrations_file(self):
+        # After a crash the registrations file (written on every live poll) is newer than the snapshot.
+        snapshot = {"saved_at": 2000, "live": {}}
+        self.mock_load_json.side_effect = lambda path, description: snapshot if path == "twitch_live_state.json" else {}
+        with patch('os.path.exists', return_value=True), patch('os.path.getmtime', return_value=3000):
+            cog = TwitchNotificationsCog(self.mock_bot)
+        self.assertEqual(cog.last_known_live_at, 3000)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_live_state_snapshot')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.process_stream_status', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_streams_by_user_ids', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_app_access_token', new_callable=AsyncMock)
+    async def test_reconcile_live_state_uses_batched_streams(self, mock_get_token, mock_get_streams, mock_process,
+                                                             mock_save, mock_save_snapshot):
+        mock_get_token.return_value = "fake_access_token"
+        mock_get_streams.return_value = {"1": {"id": "s1", "user_id": "1"}}
+        self.cog._get_notification_channel = MagicMock(return_value=MagicMock())
+        self.cog.guild_stream_registrations = {
+            "100": {str(i): {"login_name": f"user{i}"} for i in range(150)},
+            "200": {"1": {"login_name": "user1"}},
+        }
+
+        reconciled = await self.cog.reconcile_live_state()
+
+        self.assertEqual(reconciled, 150)
+        self.assertEqual(mock_get_streams.call_count, 2) # 150 broadcasters -> two batches of up to 100
+        self.assertEqual(mock_process.call_count, 151)
+        live_calls = [c for c in mock_process.call_args_list if c.args[4] is not None]
+        self.assertEqual(len(live_calls), 2) # Broadcaster "1" in both guilds
+        mock_save_snapshot.assert_called_once()
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.process_stream_status', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_streams_by_user_ids', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_app_access_token', new_callable=AsyncMock)
+    async def test_poll_wheel_slot_checks_each_broadcaster_once_per_revolution(self, mock_get_token, mock_get_streams, mock_process):
+        mock_get_token.return_value = "fake_access_token"
+        mock_get_streams.return_value = {}
+        self.cog._get_notification_channel = MagicMock(return_value=MagicMock())
+        self.cog.guild_stream_registrations = {
+            "100": {str(i): {"login_name": f"user{i}"} for i in range(30)},
+            "200": {"0": {"login_name": "user0"}},
+        }
+
+        checked = [await self.cog.poll_wheel_slot() for _ in range(self.cog.poll_wheel.num_slots)]
+
+        self.assertEqual(sum(checked), 30)
+        self.assertLessEqual(max(checked), 3) # 30 broadcasters over 12 slots
+        self.assertEqual(mock_process.call_count, 31) # Broadcaster "0" fans out to both guilds
+
+    async def test_send_go_live_merges_into_digest_up_to_embed_limit(self):
+        self.cog.guild_settings = {"100": {"twitch_digest_seconds": 120}}
+        channel = MagicMock()
+        channel.id = 1
+        sent_messages = []
+        def make_message(**kwargs):
+            message = MagicMock()
+            message.id = len(sent_messages) + 1
+            message.channel = channel
+            message.edit = AsyncMock()
+            sent_messages.append(message)
+            return message
+        channel.send = AsyncMock(side_effect=make_message)
+
+        results = [await self.cog._send_go_live("100", channel, discord.Embed(title=f"Streamer {i}")) for i in range(11)]
+
+        self.assertEqual(channel.send.call_count, 2) # Ten embeds fit in the first digest, the eleventh opens a new one
+        self.assertEqual([index for _, index in results], list(range(10)) + [0])
+        self.assertEqual(len(sent_messages[0].edit.call_args.kwargs['embeds']), 10)
+
+    async def test_send_go_live_without_digest_sends_separately(self):
+        channel = MagicMock()
+        channel.send = AsyncMock(return_value=MagicMock())
+
+        await self.cog._send_go_live("100", channel, discord.Embed(title="One"))
+        await self.cog._send_go_live("100", channel, discord.Embed(title="Two"))
+
+        self.assertEqual(channel.send.call_count, 2)
+        self.assertEqual(self.cog._go_live_digests, {})
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_game_info', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_user_profile', new_callable=AsyncMock)
+    async def test_go_live_is_queued_then_delivered(self, mock_profile, mock_game, mock_save):
+        mock_profile.return_value = None
+        mock_game.return_value = None
+        channel = MagicMock()
+        channel.send = AsyncMock(return_value=MagicMock(id=999))
+        details = {"login_name": "streamer", "display_name": "Streamer", "last_live_status": False}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+
+        await self.cog.process_stream_status("100", channel, "42", details,
+                                             {"id": "s1", "title": "Hello", "viewer_count": 3, "game_name": "Chess"}, {})
+        self.assertEqual(self.cog.delivery_queue.depth, 1)
+        channel.send.assert_not_called()
+
+        await self.cog.delivery_queue.run_pending()
+
+        channel.send.assert_awaited_once()
+        self.assertEqual(details["last_message_id"], 999)
+        self.assertTrue(details["last_live_status"])
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_game_info', new_callable=AsyncMock)
+    @patch('cogs.twitch_notifications.twitch_notifications_cog.TwitchNotificationsCog.get_twitch_user_profile', new_callable=AsyncMock)
+    async def test_go_live_lost_before_delivery_is_announced_after_restart(self, mock_profile, mock_game, mock_save):
+        mock_profile.return_value = None
+        mock_game.return_value = None
+        channel = MagicMock()
+        channel.send = AsyncMock(return_value=MagicMock(id=999))
+        # Saved as live before the process died, but the queued announcement was never sent.
+        details = {"login_name": "streamer", "last_live_status": True, "last_stream_id": "s1", "last_message_id": None}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+
+        await self.cog.process_stream_status("100", channel, "42", details, {"id": "s1", "viewer_count": 3}, {})
+        await self.cog.delivery_queue.run_pending()
+
+        channel.send.assert_awaited_once()
+        self.assertEqual(details["last_message_id"], 999)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_live_edits_of_a_digest_message_share_one_job(self, mock_save):
+        embeds = [discord.Embed(title=f"s{i}", description="**Title**\n\n🎮 Playing: **Chess**\n👥 Current Viewers: **0**")
+                  for i in range(3)]
+        message = MagicMock(id=7, embeds=embeds)
+        message.edit = AsyncMock()
+        self.cog.delivery.fetch_message = AsyncMock(return_value=message)
+        channel = MagicMock()
+        streams = {str(i): {"login_name": f"streamer{i}", "last_live_status": True, "last_stream_id": f"s{i}",
+                            "last_message_id": 7, "last_message_embed_index": i, "last_game_id": "1"} for i in range(3)}
+        self.cog.guild_stream_registrations = {"100": streams}
+
+        for tid, details in streams.items():
+            await self.cog.process_stream_status("100", channel, tid, details,
+                                                 {"id": f"s{tid}", "viewer_count": 10 + int(tid), "game_id": "1",
+                                                  "game_name": "Chess", "title": "Title"}, {})
+        self.assertEqual(self.cog.delivery_queue.depth, 1)
+        await self.cog.delivery_queue.run_pending()
+
+        self.cog.delivery.fetch_message.assert_awaited_once()
+        message.edit.assert_awaited_once()
+        self.assertEqual([e.description.split("\n")[-1] for e in message.edit.call_args.kwargs["embeds"]],
+                         [f"👥 Current Viewers: **{10 + i}**" for i in range(3)])
+
+    async def test_superseded_go_live_is_no_longer_pending(self):
+        channel = MagicMock()
+        channel.send = AsyncMock()
+        details = {"login_name": "streamer", "last_live_status": False, "last_stream_id": None}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+        self.cog._pending_announcements.add(("100", "42"))
+
+        await self.cog._deliver_go_live("100", channel, "42", details, "s1", discord.Embed(title="live")) # Stream ended
+
+        channel.send.assert_not_called()
+        self.assertEqual(self.cog._pending_announcements, set())
+
+    async def test_autocomplete_offers_registered_logins_by_prefix(self):
+        self.cog.guild_stream_registrations = {"100": {
+            "1": {"login_name": "streamer_one", "display_name": "StreamerOne"},
+            "2": {"login_name": "streamer_two", "display_name": "StreamerTwo"},
+            "3": {"login_name": "other", "display_name": "Other"},
+        }}
+        interaction = MagicMock(guild_id=100)
+
+        choices = await self.cog.twitch_notify_remove_autocomplete(interaction, "Streamer_T")
+
+        self.assertEqual([(c.name, c.value) for c in choices], [("StreamerTwo (streamer_two)", "streamer_two")])
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_notifyremove_keeps_login_index_in_step(self, mock_save):
+        self.cog.guild_stream_registrations = {"100": {
+            "1": {"login_name": "streamer_one", "display_name": "StreamerOne"},
+            "2": {"login_name": "streamer_two", "display_name": "StreamerTwo"},
+        }}
+        interaction = MagicMock(guild_id=100)
+        interaction.response.defer = AsyncMock()
+        interaction.followup.send = AsyncMock()
+
+        await self.cog.twitch_notify_remove.callback(self.cog, interaction, "STREAMER_ONE")
+
+        interaction.followup.send.assert_awaited_once_with("`StreamerOne` unregistered from notifications.")
+        self.assertNotIn("1", self.cog.guild_stream_registrations["100"])
+        self.assertEqual(self.cog._login_index("100").complete("streamer"), [("streamer_two", "2")])
+
+        # A rename from the identity refresh is reflected in autocomplete too.
+        self.cog._apply_identity_update("2", "renamed", "Renamed")
+        self.assertEqual(self.cog._login_index("100").complete("streamer"), [])
+        self.assertEqual(self.cog._login_index("100").find("renamed"), "2")
+
+    async def test_notifylist_is_paginated_and_cached_until_registrations_change(self):
+        self.cog.guild_stream_registrations = {"100": {
+            str(i): {"login_name": f"streamer{i:02d}", "display_name": f"Streamer{i:02d}",
+                     "last_live_status": i % 2 == 0, "last_game_name": "Chess" if i % 4 == 0 else "Go"}
+            for i in range(40)}}
+
+        embed, page, total_pages = self.cog.render_notifylist_page("100", "Guild", False, None, 0)
+        self.assertEqual((page, total_pages), (0, 3))
+        self.assertEqual(len(embed.description.split("\n")), 15)
+        self.assertTrue(embed.description.startswith("- **Streamer00**"))
+
+        # Out-of-range pages are clamped; a second render of a page comes from the cache.
+        last, page, _ = self.cog.render_notifylist_page("100", "Guild", False, None, 99)
+        self.assertEqual(page, 2)
+        self.assertEqual(len(last.description.split("\n")), 10)
+        self.assertIn(((False, ''), 2), self.cog._notifylist_cache["100"]["pages"])
+
+        embed, _, total_pages = self.cog.render_notifylist_page("100", "Guild", True, "CHESS", 0)
+        self.assertEqual(total_pages, 1)
+        self.assertEqual(embed.footer.text, "Page 1/1 · 10 channel(s)")
+
+        self.cog._apply_identity_update("0", "zzz", "Zzz")
+        self.assertNotIn("100", self.cog._notifylist_cache)
+        embed, _, _ = self.cog.render_notifylist_page("100", "Guild", False, None, 0)
+        self.assertTrue(embed.description.startswith("- **Streamer01**"))
+
+    async def test_notifylist_view_buttons_turn_pages(self):
+        self.cog.guild_stream_registrations = {"100": {
+            str(i): {"login_name": f"streamer{i:02d}", "display_name": f"Streamer{i:02d}"} for i in range(20)}}
+        interaction = MagicMock(guild_id=100, guild=None)
+        interaction.user.id = 7
+        interaction.response.send_message = AsyncMock()
+
+        await self.cog.twitch_notify_list.callback(self.cog, interaction)
+
+        view = interaction.response.send_message.call_args.kwargs["view"]
+        self.assertTrue(view.previous_page.disabled)
+        click = MagicMock()
+        click.response.edit_message = AsyncMock()
+        await view.next_page.callback(click)
+        self.assertEqual(view.page, 1)
+        self.assertTrue(view.next_page.disabled)
+        self.assertIn("Page 2/2", click.response.edit_message.call_args.kwargs["embed"].footer.text)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_live_state_snapshot')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_shutdown_delivers_queued_announcements_before_saving(self, mock_save, mock_snapshot):
+        channel = MagicMock()
+        channel.send = AsyncMock(return_value=MagicMock(id=999))
+        details = {"login_name": "streamer", "last_live_status": True, "last_stream_id": "s1"}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+        self.cog._pending_announcements.add(("100", "42"))
+        self.cog.delivery_queue.submit(0, functools.partial(self.cog._deliver_go_live, "100", channel, "42", details, "s1",
+                                                            discord.Embed(title="live")))
+
+        await self.cog.shutdown(timeout=1)
+        await self.cog.shutdown(timeout=1) # Second call is a no-op
+
+        channel.send.assert_awaited_once()
+        self.assertEqual(details["last_message_id"], 999)
+        self.assertEqual(mock_snapshot.call_count, 1)
+        self.assertTrue(self.cog._http_session is None or self.cog._http_session.closed)
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_live_state_snapshot')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_shutdown_deadline_returns_unsent_announcements(self, mock_save, mock_snapshot):
+        details = {"login_name": "streamer", "last_live_status": True, "last_stream_id": "s1", "last_message_id": None}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+        self.cog._pending_announcements.add(("100", "42"))
+        self.cog.delivery_queue.drain = AsyncMock(return_value=False)
+
+        with self.assertLogs('decayeddojo.twitch', level='WARNING'):
+            await self.cog.shutdown(timeout=0)
+
+        # Saved as offline, so the still-live stream is announced after the restart instead of being lost.
+        self.assertFalse(details["last_live_status"])
+        saved_registrations = [c.args[0] for c in mock_save.call_args_list if c.args[1] == "stream_registrations.json"]
+        self.assertFalse(saved_registrations[-1]["100"]["42"]["last_live_status"])
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_live_state_snapshot')
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_summaries_unsent_at_shutdown_are_sent_after_restart(self, mock_save, mock_snapshot):
+        channel = MagicMock(spec=discord.TextChannel)
+        channel.id = 55
+        channel.send = AsyncMock()
+        self.cog._queue_summary(1, channel, [discord.Embed(title="Stream ended")], "Sent offline notification for %s", "streamer")
+        self.cog.delivery_queue.drain = AsyncMock(return_value=False)
+
+        with self.assertLogs('decayeddojo.twitch', level='WARNING'):
+            await self.cog.shutdown(timeout=0)
+        saved = [c.args[0] for c in mock_save.call_args_list if c.args[1] == "twitch_pending_summaries.json"][-1]
+        self.assertEqual(len(saved["summaries"]), 1)
+
+        self.mock_load_json.side_effect = lambda path, description: saved if path == "twitch_pending_summaries.json" else {}
+        restarted = TwitchNotificationsCog(self.mock_bot)
+        self.mock_bot.get_channel.return_value = channel
+        self.assertEqual(restarted._requeue_saved_summaries(), 1)
+        await restarted.delivery_queue.run_pending()
+
+        channel.send.assert_awaited_once()
+        self.assertEqual(channel.send.call_args.kwargs["embed"].title, "Stream ended")
+        self.assertEqual(restarted._pending_summaries, {})
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_viewer_samples_are_kept_when_message_edits_fail(self, mock_save):
+        clock = VirtualClock(1_000_000)
+        self.cog.clock = clock
+        channel = MagicMock()
+        self.cog.delivery.fetch_message = AsyncMock(side_effect=discord.HTTPException(MagicMock(status=503), "unavailable"))
+        details = {"login_name": "streamer", "last_live_status": True, "last_stream_id": "s1", "last_message_id": 5,
+                   "last_game_id": "1"}
+        self.cog.guild_stream_registrations = {"100": {"42": details}}
+
+        for viewers in (10, 40, 25):
+            await self.cog.process_stream_status("100", channel, "42", details,
+                                                 {"id": "s1", "viewer_count": viewers, "game_id": "1"}, {})
+            await self.cog.delivery_queue.run_pending()
+            clock.advance(60)
+
+        self.assertEqual(details["viewer_count_samples"], 3)
+        self.assertEqual((details["peak_viewers"], details["avg_viewers"], details["median_viewers"]), (40, 25, 25))
+
+    @patch('cogs.twitch_notifications.twitch_notifications_cog._save_json_data')
+    async def test_viewer_sampling_rate_is_configurable(self, mock_save):
+        clock = VirtualClock(1_000_000)
+        self.cog.clock = clock
+        details = {"last_viewer_sample_at": None}
+        with patch('cogs.twitch_notifications.twitch_notifications_cog.VIEWER_SAMPLE_SECONDS', 300):
+            for minute in range(10):
+                self.cog._sample_viewers(details, 100 + minute)
+                clock.advance(60)
+        self.assertEqual(details["viewer_count_samples"], 2) # Minutes 0 and 5
+
     # Similar tests can be written for get_twitch_user_profile, get_game_info, get_stream_clips
     # by mocking aiohttp.ClientSession.get and the responses.
 
@@ -0,0 +1,51 @@
+import json
+import random
+import unittest
+
+from cogs.twitch_notifications.viewer_stats import P2Quantile, add_viewer_sample
+
+class TestViewerStats(unittest.TestCase):
+
+    def test_p2_median_is_exact_for_few_samples(self):
+        sketch = P2Quantile(0.5)
+        for x in (30, 10, 20):
+            sketch.add(x)
+        self.assertEqual(sketch.value(), 20)
+
+    def test_p2_tracks_quantiles_in_constant_memory(self):
+        rng = random.Random(7)
+        samples = [rng.lognormvariate(5, 1) for _ in range(5000)]
+        for p in (0.5, 0.9):
+            sketch = P2Quantile(p)
+            for x in samples:
+                sketch.add(x)
+            exact = sorted(samples)[int(p * len(samples))]
+            self.assertAlmostEqual(sketch.value(), exact, delta=exact * 0.05)
+            self.assertEqual(len(sketch.q), 5)
+
+    def test_p2_state_round_trips_through_json(self):
+        rng = random.Random(1)
+        samples = [rng.randint(0, 1000) for _ in range(200)]
+        uninterrupted = P2Quantile(0.5)
+        for x in samples:
+            uninterrupted.add(x)
+
+        resumed = P2Quantile(0.5)
+        for x in samples[:100]:
+            resumed.add(x)
+        resumed = P2Quantile(0.5, json.loads(json.dumps(resumed.state)))
+        for x in samples[100:]:
+            resumed.add(x)
+        self.assertEqual(resumed.value(), uninterrupted.value())
+
+    def test_add_viewer_sample_updates_peak_mean_and_median(self):
+        details = {}
+        for viewers in (10, 50, 30):
+            add_viewer_sample(details, viewers)
+        self.assertEqual(details['peak_viewers'], 50)
+        self.assertEqual(details['avg_viewers'], 30)
+        self.assertEqual(details['viewer_count_samples'], 3)
+        self.assertEqual(details['median_viewers'], 30)
+
+if __name__ == '__main__':
+    unittest.main()